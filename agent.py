@@ -1,10 +1,13 @@
 """Mistral AI agent with function calling support."""
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
 from mistralai import Mistral
 from config import MISTRAL_API_KEY, MISTRAL_MODEL, load_prompts
-from tools import TOOL_SCHEMAS, execute_tool
-from memory import should_summarize, create_summary_request, compress_memory
+from tools import TOOL_SCHEMAS, execute_tools
+from memory import (
+    should_summarize, create_summary_request, compress_memory,
+    trim_history, create_summary_message
+)
 
 
 class Agent:
@@ -19,13 +22,20 @@ class Agent:
         self.model = MISTRAL_MODEL
         self.prompts = load_prompts()
         self.system_prompt = self.prompts["system_prompt"]
-
-    def process_message(self, messages: List[Dict[str, Any]], user_input: str) -> tuple[List[Dict[str, Any]], str]:
+        self.system_message = {"role": "system", "content": self.system_prompt}
+
+    def process_message(
+        self,
+        messages: List[Dict[str, Any]],
+        user_input: str,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> tuple[List[Dict[str, Any]], str]:
         """Process user input and generate response with tool calling.
 
         Args:
             messages: Conversation history
             user_input: User's input message
+            on_text: Optional callback receiving reply text as it is streamed
 
         Returns:
             Tuple of (updated_messages, assistant_response)
@@ -38,8 +48,14 @@ class Agent:
             print("[Memory threshold reached, summarizing conversation...]")
             messages = self._summarize_and_compress(messages)
 
+        # Keep the history sent on every turn within the token budget
+        evicted, recent = trim_history(messages)
+        if evicted:
+            print("[Context budget reached, summarizing older messages...]")
+            messages = [create_summary_message(self._summarize(evicted))] + recent
+
         # Prepare messages with system prompt
-        api_messages = [{"role": "system", "content": self.system_prompt}] + messages
+        api_messages = [self.system_message] + messages
 
         # Debug: print messages being sent
         #print(f"[DEBUG] Sending {len(api_messages)} messages to API")
@@ -47,62 +63,46 @@ class Agent:
             #print(f"[DEBUG] Message {i}: role={msg.get('role')}, content={msg.get('content', '')[:50]}...")
 
         # Call Mistral API with tools
-        response = self.client.chat.complete(
-            model=self.model,
-            messages=api_messages,
-            tools=TOOL_SCHEMAS,
-        )
-
-        assistant_message = response.choices[0].message
+        content, tool_calls = self._chat(api_messages, on_text)
 
         # Handle tool calls if present
-        if assistant_message.tool_calls:
+        if tool_calls:
             # Add assistant message with tool calls
             messages.append({
                 "role": "assistant",
-                "content": assistant_message.content or "",
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    }
-                    for tc in assistant_message.tool_calls
-                ]
+                "content": content,
+                "tool_calls": tool_calls
             })
 
-            # Execute tools and collect results
-            tool_results = []
-            for tool_call in assistant_message.tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
+            # Execute tools, concurrently when the model asked for several
+            calls = []
+            for tool_call in tool_calls:
+                tool_name = tool_call["function"]["name"]
+                tool_args = tool_call["function"]["arguments"]
+                if isinstance(tool_args, str):
+                    tool_args = json.loads(tool_args)
 
                 print(f"[Executing tool: {tool_name} with args: {tool_args}]")
+                calls.append((tool_name, tool_args))
 
-                result = execute_tool(tool_name, tool_args)
-                tool_results.append(result)
+            tool_results = execute_tools(calls)
 
+            for tool_call, (tool_name, _), result in zip(tool_calls, calls, tool_results):
                 # Add tool result message
                 messages.append({
                     "role": "tool",
                     "name": tool_name,
-                    "tool_call_id": tool_call.id,
+                    "tool_call_id": tool_call["id"],
                     "content": result
                 })
 
             # Call API again with tool results
-            api_messages = [{"role": "system", "content": self.system_prompt}] + messages
-            final_response = self.client.chat.complete(
-                model=self.model,
-                messages=api_messages,
-                tools=TOOL_SCHEMAS,
-            )
+            api_messages = [self.system_message] + messages
 
-            final_message = final_response.choices[0].message
-            final_content = final_message.content or ""
+            # Keep the first reply from running into the second one once streamed
+            if content and on_text is not None:
+                on_text(" ")
+            final_content, _ = self._chat(api_messages, on_text)
 
             # Only append assistant message if there's actual content
             if final_content:
@@ -112,10 +112,78 @@ class Agent:
 
         else:
             # No tool calls, just return the response
-            content = assistant_message.content or ""
             messages.append({"role": "assistant", "content": content})
             return messages, content
 
+    def _chat(
+        self,
+        api_messages: List[Dict[str, Any]],
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> tuple[str, List[Dict[str, Any]]]:
+        """Run one chat completion, streaming it when a text callback is given.
+
+        Args:
+            api_messages: Messages to send, system prompt included
+            on_text: Optional callback receiving content deltas as they arrive
+
+        Returns:
+            Tuple of (content, tool_calls) with tool calls in history format
+        """
+        if on_text is None:
+            response = self.client.chat.complete(
+                model=self.model,
+                messages=api_messages,
+                tools=TOOL_SCHEMAS,
+            )
+            message = response.choices[0].message
+            tool_calls = [
+                {
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {
+                        "name": tc.function.name,
+                        "arguments": tc.function.arguments
+                    }
+                }
+                for tc in message.tool_calls or []
+            ]
+            return message.content or "", tool_calls
+
+        content = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+
+        stream = self.client.chat.stream(
+            model=self.model,
+            messages=api_messages,
+            tools=TOOL_SCHEMAS,
+        )
+        with stream as events:
+            for event in events:
+                delta = event.data.choices[0].delta
+
+                if isinstance(delta.content, str) and delta.content:
+                    content.append(delta.content)
+                    on_text(delta.content)
+
+                # Tool calls may arrive split across several deltas
+                for tc in delta.tool_calls or []:
+                    call = tool_calls.setdefault(tc.index or 0, {
+                        "id": tc.id,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if tc.id and tc.id != "null":
+                        call["id"] = tc.id
+                    if tc.function.name and not call["function"]["name"]:
+                        call["function"]["name"] = tc.function.name
+                    arguments = tc.function.arguments
+                    if isinstance(arguments, dict):
+                        call["function"]["arguments"] = arguments
+                    elif arguments:
+                        call["function"]["arguments"] += arguments
+
+        return "".join(content), [tool_calls[i] for i in sorted(tool_calls)]
+
     def _summarize_and_compress(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Summarize conversation and compress memory.
 
@@ -125,6 +193,18 @@ class Agent:
         Returns:
             Compressed message history
         """
+        # Compress memory with summary
+        return compress_memory(messages, self._summarize(messages))
+
+    def _summarize(self, messages: List[Dict[str, Any]]) -> str:
+        """Ask Mistral for a summary of the given messages.
+
+        Args:
+            messages: Messages to summarize
+
+        Returns:
+            Summary text
+        """
         # Create summarization request
         summary_prompt = create_summary_request(messages, self.prompts["summarization_prompt"])
 
@@ -134,7 +214,4 @@ class Agent:
             messages=[{"role": "user", "content": summary_prompt}]
         )
 
-        summary = summary_response.choices[0].message.content
-
-        # Compress memory with summary
-        return compress_memory(messages, summary)
+        return summary_response.choices[0].message.content
@@ -40,6 +40,7 @@ TAPO_IP_ADDRESS = os.getenv("TAPO_IP_ADDRESS", "")
 # Memory management
 MEMORY_THRESHOLD_KB = 50  # Threshold to trigger summarization
 MEMORY_KEEP_LAST_N = 10   # Keep last N messages after summarization
+MEMORY_MAX_TOKENS = 4000  # Approximate token budget for history sent to the API, trimmed to half when exceeded
 
 # Load prompts from YAML
 def load_prompts():
@@ -1,27 +1,29 @@
 #!/usr/bin/env python3
 """Main CLI entry point for the agentic chatbot."""
 import sys
-import os
-import numpy as np
-import pyaudio
-import torch
-from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
-from elevenlabs import stream
-from elevenlabs.client import ElevenLabs
+from concurrent.futures import ThreadPoolExecutor
 from agent import Agent
-from memory import load_memory, save_memory
-from config import PROJECT_DIR
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv(PROJECT_DIR / ".env")
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+from memory import MemoryWriter, load_memory
+from speech import (
+    WHISPER_BATCH_SIZE,
+    WHISPER_WINDOW_SECONDS,
+    Microphone,
+    PcmPlayer,
+    SentenceSpeaker,
+)
+from services._http import get_shared_client, warm_up
+from config import ELEVENLABS_API_KEY
 
 # Global variables for voice features
-whisper_processor = None
 whisper_model = None
+batched_whisper = None
+vad_model = None
+microphone = None
 elevenlabs_client = None
 
+# Audio output, opened on the first reply and kept open between sentences
+player = PcmPlayer()
+
 
 def print_help():
     """Print help message."""
@@ -38,18 +40,47 @@ Just type your message to chat with the agent!
     """)
 
 
+def load_whisper_model(device, compute_type):
+    """Load Whisper small, with FlashAttention on GPUs that support it."""
+    from faster_whisper import WhisperModel
+
+    if device == "cuda":
+        try:
+            return WhisperModel("small", device=device, compute_type=compute_type, flash_attention=True)
+        except Exception as e:
+            print(f"⚠️  FlashAttention unavailable ({e}), using default attention")
+    return WhisperModel("small", device=device, compute_type=compute_type)
+
+
 def setup_whisper():
     """Initialize Whisper model for voice recognition."""
-    global whisper_processor, whisper_model
+    global whisper_model, batched_whisper, vad_model
 
     try:
+        # Imported here so they load alongside the ElevenLabs client and a
+        # missing package only disables voice input
+        import numpy as np
+        import ctranslate2
+        from faster_whisper import BatchedInferencePipeline
+        from silero_vad import load_silero_vad
+
         print("Loading Whisper model (this may take a moment)...")
-        whisper_processor = AutoProcessor.from_pretrained("openai/whisper-small")
-        whisper_model = AutoModelForSpeechSeq2Seq.from_pretrained("openai/whisper-small")
 
-        # Use GPU if available
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        whisper_model = whisper_model.to(device)
+        # Use GPU if available, with INT8 weights in both cases
+        if ctranslate2.get_cuda_device_count() > 0:
+            device, compute_type = "cuda", "int8_float16"
+        else:
+            device, compute_type = "cpu", "int8"
+        whisper_model = load_whisper_model(device, compute_type)
+        batched_whisper = BatchedInferencePipeline(model=whisper_model)
+
+        # Warm up on one second of silence so the first utterance doesn't
+        # pay for kernel selection and memory allocation
+        segments, _ = whisper_model.transcribe(np.zeros(16000, dtype=np.float32), language="fr", beam_size=1)
+        list(segments)
+
+        # Voice activity detection, used to stop recording when speech ends
+        vad_model = load_silero_vad()
 
         print(f"✅ Whisper model loaded on {device}")
         return True
@@ -64,7 +95,11 @@ def setup_elevenlabs():
 
     if ELEVENLABS_API_KEY:
         try:
-            elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+            from elevenlabs.client import ElevenLabs
+
+            elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=get_shared_client())
+            # Connect now so the first sentence skips the TLS handshake
+            warm_up("https://api.elevenlabs.io")
             print("✅ ElevenLabs TTS enabled")
             return True
         except Exception as e:
@@ -75,71 +110,46 @@ def setup_elevenlabs():
         return False
 
 
-def record_audio(duration=5, sample_rate=16000):
-    """Record audio from microphone."""
-    mic = pyaudio.PyAudio()
-    stream_audio = mic.open(
-        format=pyaudio.paInt16,
-        channels=1,
-        rate=sample_rate,
-        input=True,
-        frames_per_buffer=1024
-    )
-
-    print(f"🎤 Listening ({duration}s)... Speak now!")
+def record_audio(max_duration=10):
+    """Record audio from microphone until the user stops speaking."""
+    global microphone
 
-    frames = []
-    for _ in range(0, int(sample_rate / 1024 * duration)):
-        data = stream_audio.read(1024, exception_on_overflow=False)
-        frames.append(data)
+    # Open the input stream once and reuse it for every utterance
+    if microphone is None:
+        microphone = Microphone(vad_model)
 
+    print(f"🎤 Listening (up to {max_duration}s)... Speak now!")
+    audio_data = microphone.record(max_duration=max_duration)
     print("⏹️  Recording finished")
-
-    stream_audio.stop_stream()
-    stream_audio.close()
-    mic.terminate()
-
-    # Convert to numpy array
-    audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
-    audio_data = audio_data.astype(np.float32) / 32768.0  # Normalize
-
     return audio_data
 
 
 def transcribe_audio(audio_data, sample_rate=16000):
     """Transcribe audio to text using Whisper."""
-    if whisper_processor is None or whisper_model is None:
+    if whisper_model is None:
         return ""
 
     try:
-        # Prepare input
-        inputs = whisper_processor(
-            audio_data,
-            sampling_rate=sample_rate,
-            return_tensors="pt"
-        )
-
-        # Move to same device as model
-        device = whisper_model.device
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-
-        # Force English language
-        forced_decoder_ids = whisper_processor.get_decoder_prompt_ids(language="french", task="transcribe")
-
-        # Generate transcription
-        with torch.no_grad():
-            generated_ids = whisper_model.generate(
-                inputs["input_features"],
-                forced_decoder_ids=forced_decoder_ids
+        # faster-whisper takes the 16 kHz float32 mono array directly
+        if len(audio_data) > WHISPER_WINDOW_SECONDS * sample_rate:
+            # Split on speech and decode the 30 s windows in one batch
+            segments, _ = batched_whisper.transcribe(
+                audio_data,
+                language="fr",
+                beam_size=1,
+                without_timestamps=True,
+                batch_size=WHISPER_BATCH_SIZE
             )
-
-        # Decode
-        transcription = whisper_processor.batch_decode(
-            generated_ids,
-            skip_special_tokens=True
-        )[0]
-
-        return transcription.strip()
+        else:
+            segments, _ = whisper_model.transcribe(
+                audio_data,
+                language="fr",
+                beam_size=1,
+                condition_on_previous_text=False,
+                without_timestamps=True,
+                vad_filter=True
+            )
+        return " ".join(segment.text for segment in segments).strip()
     except Exception as e:
         print(f"❌ Error transcribing audio: {e}")
         return ""
@@ -147,23 +157,24 @@ def transcribe_audio(audio_data, sample_rate=16000):
 
 def listen_microphone():
     """Listen to microphone and return recognized text."""
-    audio_data = record_audio(duration=5)
+    audio_data = record_audio()
     text = transcribe_audio(audio_data)
     return text
 
 
-def speak_text(text, voice_id="19STyYD15bswVz51nqLf"):
-    """Speak text using ElevenLabs TTS."""
+def synthesize_speech(text, voice_id="19STyYD15bswVz51nqLf"):
+    """Stream the ElevenLabs TTS audio of text as raw PCM chunks."""
     if not elevenlabs_client:
         return
 
     try:
-        audio_stream = elevenlabs_client.text_to_speech.convert(
+        yield from elevenlabs_client.text_to_speech.stream(
             text=text,
             voice_id=voice_id,
-            model_id="eleven_multilingual_v2"
+            model_id="eleven_turbo_v2_5",
+            output_format="pcm_22050",
+            optimize_streaming_latency=3
         )
-        stream(audio_stream)
     except Exception as e:
         print(f"⚠️  Error with TTS: {e}")
 
@@ -205,8 +216,12 @@ def main():
 
     # Initialize voice features
     print("\nInitializing voice features...")
-    whisper_available = setup_whisper()
-    tts_available = setup_elevenlabs()
+    # Load Whisper while the ElevenLabs client is being set up
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        whisper_future = executor.submit(setup_whisper)
+        tts_future = executor.submit(setup_elevenlabs)
+        whisper_available = whisper_future.result()
+        tts_available = tts_future.result()
 
     print("\n" + "=" * 60)
     if whisper_available:
@@ -227,6 +242,9 @@ def main():
     if messages:
         print(f"[Loaded {len(messages)} messages from previous session]\n")
 
+    # Saves run in the background while the user types the next message
+    memory_writer = MemoryWriter()
+
     # Main chat loop
     while True:
         try:
@@ -242,7 +260,7 @@ def main():
 
                 if command in ["/exit", "/quit"]:
                     print("\nSaving conversation and exiting...")
-                    save_memory(messages)
+                    memory_writer.save(messages)
                     print("Goodbye!")
                     break
 
@@ -252,7 +270,7 @@ def main():
 
                 elif command == "/clear":
                     messages = []
-                    save_memory(messages)
+                    memory_writer.save(messages)
                     print("[Conversation history cleared]\n")
                     continue
 
@@ -273,15 +291,24 @@ def main():
 
             # Process message with agent
             try:
-                messages, response = agent.process_message(messages, user_input)
+                # Speak the response sentence by sentence while it streams
+                speaker = SentenceSpeaker(synthesize_speech, player.play) if tts_available else None
+                try:
+                    messages, response = agent.process_message(
+                        messages,
+                        user_input,
+                        on_text=speaker.feed if speaker else None
+                    )
+                finally:
+                    if speaker:
+                        speaker.close()
                 print(f"\nGladys: {response}\n")
 
-                # Speak the response if TTS is available
-                if tts_available:
-                    speak_text(response)
+                if speaker:
+                    speaker.join()
 
                 # Save after each interaction
-                save_memory(messages)
+                memory_writer.save(messages)
 
             except Exception as e:
                 print(f"\nError processing message: {e}\n")
@@ -289,16 +316,18 @@ def main():
 
         except KeyboardInterrupt:
             print("\n\nInterrupted. Saving conversation...")
-            save_memory(messages)
+            memory_writer.save(messages)
             print("Goodbye!")
             break
 
         except EOFError:
             print("\n\nSaving conversation...")
-            save_memory(messages)
+            memory_writer.save(messages)
             print("Goodbye!")
             break
 
+    memory_writer.close()
+
 
 if __name__ == "__main__":
     main()
@@ -1,25 +1,22 @@
 #!/usr/bin/env python3
-"""Web-based GUI interface for Gladys using Gradio with PyAudio recording."""
-import os
+"""Web-based GUI interface for Gladys using Gradio with browser microphone streaming."""
 import sys
-import threading
-import time
-import numpy as np
-import pyaudio
-import torch
-from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
-from elevenlabs import stream
-from elevenlabs.client import ElevenLabs
+from concurrent.futures import ThreadPoolExecutor
 from agent import Agent
-from memory import load_memory, save_memory
-from config import PROJECT_DIR
-from dotenv import load_dotenv
+from memory import MemoryWriter, load_memory
+from speech import (
+    WHISPER_BATCH_SIZE,
+    WHISPER_WINDOW_SECONDS,
+    Endpointer,
+    PcmPlayer,
+    SentenceSpeaker,
+    Utterance,
+    to_mono_16k,
+)
+from services._http import get_shared_client, warm_up
+from config import ELEVENLABS_API_KEY
 import gradio as gr
 
-# Load environment variables
-load_dotenv(PROJECT_DIR / ".env")
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-
 
 class GladysGradioApp:
     """Gradio-based GUI application for Gladys chatbot."""
@@ -28,14 +25,17 @@ class GladysGradioApp:
         """Initialize the application."""
         self.agent = None
         self.messages = []
-        self.whisper_processor = None
         self.whisper_model = None
+        self.batched_whisper = None
+        self.load_vad = None
+        self.vads = {}
+        self.utterances = {}
         self.elevenlabs_client = None
+        self.player = PcmPlayer()
         self.whisper_available = False
         self.tts_available = False
         self.use_voice_output = True
-        self.is_recording = False
-        self.recorded_audio = None
+        self.memory_writer = MemoryWriter()
 
         # Initialize services
         self.initialize_services()
@@ -50,13 +50,13 @@ class GladysGradioApp:
             self.messages = load_memory()
             print(f"Loaded History: {len(self.messages)} messages")
 
-            # Initialize Whisper
-            print("Loading Whisper...")
-            self.whisper_available = self.setup_whisper()
-
-            # Initialize ElevenLabs
-            print("Loading ElevenLabs...")
-            self.tts_available = self.setup_elevenlabs()
+            # Initialize Whisper and ElevenLabs concurrently
+            print("Loading Whisper and ElevenLabs...")
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                whisper_future = executor.submit(self.setup_whisper)
+                tts_future = executor.submit(self.setup_elevenlabs)
+                self.whisper_available = whisper_future.result()
+                self.tts_available = tts_future.result()
 
             print("All services are ready!")
 
@@ -64,14 +64,46 @@ class GladysGradioApp:
             print(f"Initialization error : {e}")
             sys.exit(1)
 
+    def load_whisper_model(self, device, compute_type):
+        """Load Whisper small, with FlashAttention on GPUs that support it."""
+        from faster_whisper import WhisperModel
+
+        if device == "cuda":
+            try:
+                return WhisperModel("small", device=device, compute_type=compute_type, flash_attention=True)
+            except Exception as e:
+                print(f"FlashAttention unavailable ({e}), using default attention")
+        return WhisperModel("small", device=device, compute_type=compute_type)
+
     def setup_whisper(self):
         """Initialize Whisper model for voice recognition."""
         try:
-            self.whisper_processor = AutoProcessor.from_pretrained("openai/whisper-small")
-            self.whisper_model = AutoModelForSpeechSeq2Seq.from_pretrained("openai/whisper-small")
+            # Imported here so they load in parallel with the ElevenLabs client
+            import numpy as np
+            import ctranslate2
+            from faster_whisper import BatchedInferencePipeline
+            from silero_vad import load_silero_vad
+
+            if ctranslate2.get_cuda_device_count() > 0:
+                device, compute_type = "cuda", "int8_float16"
+            else:
+                device, compute_type = "cpu", "int8"
+            self.whisper_model = self.load_whisper_model(device, compute_type)
+            self.batched_whisper = BatchedInferencePipeline(model=self.whisper_model)
+
+            # Warm up so the first utterance isn't slowed by one-time setup
+            segments, _ = self.whisper_model.transcribe(
+                np.zeros(16000, dtype=np.float32),
+                language="fr",
+                beam_size=1
+            )
+            list(segments)
 
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.whisper_model = self.whisper_model.to(device)
+            # Voice activity detection, used to stop recording when speech ends.
+            # The model is stateful, so each browser session gets its own
+            self.load_vad = load_silero_vad
+            # Loaded once here so a broken install fails at startup, not on first speech
+            load_silero_vad()
             print(f"Whisper loaded on {device}")
             return True
         except Exception as e:
@@ -82,7 +114,11 @@ class GladysGradioApp:
         """Initialize ElevenLabs client for text-to-speech."""
         if ELEVENLABS_API_KEY:
             try:
-                self.elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+                from elevenlabs.client import ElevenLabs
+
+                self.elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=get_shared_client())
+                # Connect now so the first sentence skips the TLS handshake
+                warm_up("https://api.elevenlabs.io")
                 print("ElevenLabs activated")
                 return True
             except Exception as e:
@@ -91,96 +127,71 @@ class GladysGradioApp:
         print("ElevenLabs disabled(no API key)")
         return False
 
-    def record_audio_pyaudio(self, duration=5, sample_rate=16000):
-        """Record audio from microphone using PyAudio."""
-        try:
-            mic = pyaudio.PyAudio()
-
-            # Get default input device
-            default_device = mic.get_default_input_device_info()
-            print(f"Using microphone: {default_device['name']}")
-
-            stream_audio = mic.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=sample_rate,
-                input=True,
-                frames_per_buffer=1024
-            )
-
-            print(f"🎤 Recording ({duration}s)... Speak now!")
-            frames = []
-
-            for i in range(0, int(sample_rate / 1024 * duration)):
-                data = stream_audio.read(1024, exception_on_overflow=False)
-                frames.append(data)
-
-            print("⏹️  Recording finished")
-            stream_audio.stop_stream()
-            stream_audio.close()
-            mic.terminate()
-
-            # Convert to numpy array
-            audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
-            audio_data = audio_data.astype(np.float32) / 32768.0
-
-            return audio_data, sample_rate
-
-        except Exception as e:
-            print(f"Recording error: {e}")
-            return None, sample_rate
-
     def transcribe_audio(self, audio_data, sample_rate=16000):
         """Transcribe audio to text using Whisper."""
-        if self.whisper_processor is None or self.whisper_model is None:
+        if self.whisper_model is None:
             return ""
 
         try:
-            inputs = self.whisper_processor(
-                audio_data,
-                sampling_rate=sample_rate,
-                return_tensors="pt"
-            )
-
-            device = self.whisper_model.device
-            inputs = {k: v.to(device) for k, v in inputs.items()}
-
-            forced_decoder_ids = self.whisper_processor.get_decoder_prompt_ids(
-                language="french",
-                task="transcribe"
-            )
-
-            with torch.no_grad():
-                generated_ids = self.whisper_model.generate(
-                    inputs["input_features"],
-                    forced_decoder_ids=forced_decoder_ids
+            if len(audio_data) > WHISPER_WINDOW_SECONDS * sample_rate:
+                # Split on speech and decode the 30 s windows in one batch
+                segments, _ = self.batched_whisper.transcribe(
+                    audio_data,
+                    language="fr",
+                    beam_size=1,
+                    without_timestamps=True,
+                    batch_size=WHISPER_BATCH_SIZE
                 )
-
-            transcription = self.whisper_processor.batch_decode(
-                generated_ids,
-                skip_special_tokens=True
-            )[0]
-
-            return transcription.strip()
+            else:
+                segments, _ = self.whisper_model.transcribe(
+                    audio_data,
+                    language="fr",
+                    beam_size=1,
+                    condition_on_previous_text=False,
+                    without_timestamps=True,
+                    vad_filter=True
+                )
+            return " ".join(segment.text for segment in segments).strip()
         except Exception as e:
             print(f"Transcription error: {e}")
             return ""
 
-    def speak_text(self, text, voice_id="19STyYD15bswVz51nqLf"):
-        """Speak text using ElevenLabs TTS."""
+    def synthesize_speech(self, text, voice_id="19STyYD15bswVz51nqLf"):
+        """Stream the ElevenLabs TTS audio of text as raw PCM chunks."""
         if not self.elevenlabs_client or not self.use_voice_output:
             return
 
         try:
-            audio_stream = self.elevenlabs_client.text_to_speech.convert(
+            yield from self.elevenlabs_client.text_to_speech.stream(
                 text=text,
                 voice_id=voice_id,
-                model_id="eleven_multilingual_v2"
+                model_id="eleven_turbo_v2_5",
+                output_format="pcm_22050",
+                optimize_streaming_latency=3
             )
-            stream(audio_stream)
         except Exception as e:
             print(f"⚠️  Erreur TTS: {e}")
 
+    def reply(self, message):
+        """Send a message to the agent, speaking the reply while it streams."""
+        speaker = None
+        if self.use_voice_output and self.tts_available:
+            speaker = SentenceSpeaker(self.synthesize_speech, self.player.play)
+
+        try:
+            self.messages, response = self.agent.process_message(
+                self.messages,
+                message,
+                on_text=speaker.feed if speaker else None
+            )
+        finally:
+            if speaker:
+                speaker.close()
+
+        # Save memory
+        self.memory_writer.save(self.messages)
+        return response
+
     def process_text_message(self, message, history):
         """Process text message and return response."""
         if not message or not message.strip():
@@ -188,14 +199,7 @@ class GladysGradioApp:
 
         try:
             # Process with agent
-            self.messages, response = self.agent.process_message(self.messages, message)
-
-            # Save memory
-            save_memory(self.messages)
-
-            # Speak if TTS enabled
-            if self.use_voice_output and self.tts_available:
-                threading.Thread(target=self.speak_text, args=(response,), daemon=True).start()
+            response = self.reply(message)
 
             # Update history
             history.append((message, response))
@@ -207,34 +211,55 @@ class GladysGradioApp:
             history.append((message, error_msg))
             return history, ""
 
-    def start_recording(self, history, duration_slider):
-        """Start recording audio with PyAudio."""
+    def on_audio_chunk(self, chunk, history, request: gr.Request):
+        """Buffer a streamed microphone chunk and reply once speech ends."""
         if not self.whisper_available:
-            return history, "Speech recognition not available"
-
+            return gr.skip(), "Speech recognition not available"
+        if chunk is None:
+            return gr.skip(), gr.skip()
+
+        # One utterance and VAD model per browser session, so sessions
+        # never reset each other's VAD state
+        session = request.session_hash
+        utterance = self.utterances.get(session)
+        if utterance is None:
+            vad = self.vads.get(session)
+            if vad is None:
+                vad = self.vads[session] = self.load_vad()
+            utterance = self.utterances[session] = Utterance(vad)
+
+        sample_rate, data = chunk
+        if not utterance.feed(to_mono_16k(sample_rate, data)):
+            if utterance.endpointer.state == Endpointer.LISTENING:
+                return gr.skip(), "Listening..."
+            return gr.skip(), gr.skip()
+
+        del self.utterances[session]
+        return self.respond_to_audio(utterance.audio(), history)
+
+    def on_recording_stopped(self, history, request: gr.Request):
+        """Reply to whatever was said before the microphone was stopped."""
+        utterance = self.utterances.pop(request.session_hash, None)
+        if utterance is None or utterance.endpointer.state == Endpointer.IDLE:
+            return history, "Ready to record"
+        return self.respond_to_audio(utterance.audio(), history)
+
+    def on_session_closed(self, request: gr.Request):
+        """Release the VAD model and pending audio of a closed browser tab."""
+        self.utterances.pop(request.session_hash, None)
+        self.vads.pop(request.session_hash, None)
+
+    def respond_to_audio(self, audio_data, history):
+        """Transcribe a recorded utterance and send it to the agent."""
         try:
-            status_msg = f"Recording in progress ({int(duration_slider)}s)... Speak now!"
-
-            # Record audio
-            audio_data, sample_rate = self.record_audio_pyaudio(duration=int(duration_slider))
-
-            if audio_data is None:
-                return history, "Recording error"
-
             # Transcribe
-            status_msg = "Transcribing..."
-            text = self.transcribe_audio(audio_data, sample_rate=sample_rate)
+            text = self.transcribe_audio(audio_data)
 
             if not text:
                 return history, "No text detected, please speak closer to the mic and louder."
 
             # Process message
-            self.messages, response = self.agent.process_message(self.messages, text)
-            save_memory(self.messages)
-
-            # Speak if TTS enabled
-            if self.use_voice_output and self.tts_available:
-                threading.Thread(target=self.speak_text, args=(response,), daemon=True).start()
+            response = self.reply(text)
 
             # Update history
             history.append((f"{text}", response))
@@ -248,7 +273,7 @@ class GladysGradioApp:
     def clear_conversation(self):
         """Clear conversation history."""
         self.messages = []
-        save_memory(self.messages)
+        self.memory_writer.save(self.messages)
         return [], "History cleared"
 
     def toggle_voice_output(self, enabled):
@@ -292,15 +317,13 @@ class GladysGradioApp:
                 # Voice mode
                 with gr.Tab("Voice Mode"):
                     gr.Markdown("### Recording instructions")
-                    gr.Markdown("Click 'Record' and speak for the chosen duration")
-
-                    duration_slider = gr.Slider(
-                        minimum=3,
-                        maximum=10,
-                        value=5,
-                        step=1,
-                        label="Recording Duration (seconds)",
-                        interactive=True
+                    gr.Markdown("Start the microphone and speak, Gladys answers when you stop talking")
+
+                    microphone = gr.Audio(
+                        sources=["microphone"],
+                        type="numpy",
+                        streaming=True,
+                        label="Microphone"
                     )
 
                     voice_status = gr.Textbox(
@@ -309,13 +332,6 @@ class GladysGradioApp:
                         interactive=False
                     )
 
-                    with gr.Row():
-                        record_btn = gr.Button(
-                            "Record and transcribe",
-                            variant="primary",
-                            size="lg"
-                        )
-
             # Controls
             with gr.Row():
                 voice_output_checkbox = gr.Checkbox(
@@ -343,9 +359,17 @@ class GladysGradioApp:
                 outputs=[chatbot, text_input]
             )
 
-            record_btn.click(
-                fn=self.start_recording,
-                inputs=[chatbot, duration_slider],
+            microphone.stream(
+                fn=self.on_audio_chunk,
+                inputs=[microphone, chatbot],
+                outputs=[chatbot, voice_status],
+                stream_every=0.5,
+                show_progress="hidden"
+            )
+
+            microphone.stop_recording(
+                fn=self.on_recording_stopped,
+                inputs=[chatbot],
                 outputs=[chatbot, voice_status]
             )
 
@@ -368,6 +392,8 @@ class GladysGradioApp:
                 outputs=[chatbot]
             )
 
+            demo.unload(self.on_session_closed)
+
         return demo
 
     def get_status_text(self):
@@ -376,9 +402,9 @@ class GladysGradioApp:
         features = []
 
         if self.whisper_available:
-            features.append("Pyaudio Speech Recognition : OK")
+            features.append("Speech Recognition : OK")
         else:
-            features.append("Pyaudio Speech Recognition : ERROR")
+            features.append("Speech Recognition : ERROR")
 
         if self.tts_available:
             features.append("Speech Synthesis (ElevenLabs) : OK")
@@ -390,27 +416,13 @@ class GladysGradioApp:
 
     def load_history(self):
         """Load conversation history."""
-        history = []
-
-        # Convert messages to chat history format
-        i = 0
-        while i < len(self.messages):
-            if i + 1 < len(self.messages):
-                user_msg = self.messages[i]
-                assistant_msg = self.messages[i + 1]
-
-                if user_msg.get("role") == "user" and assistant_msg.get("role") == "assistant":
-                    history.append((
-                        user_msg.get("content", ""),
-                        assistant_msg.get("content", "")
-                    ))
-                    i += 2
-                else:
-                    i += 1
-            else:
-                i += 1
-
-        return history
+        # Convert adjacent user/assistant messages to chat history pairs;
+        # summaries and tool messages in between are skipped
+        return [
+            (user_msg.get("content", ""), assistant_msg.get("content", ""))
+            for user_msg, assistant_msg in zip(self.messages, self.messages[1:])
+            if user_msg.get("role") == "user" and assistant_msg.get("role") == "assistant"
+        ]
 
     def launch(self, share=True):
         """Launch the Gradio interface."""
@@ -421,12 +433,13 @@ class GladysGradioApp:
             server_port=7860,
             show_error=True
         )
+        self.memory_writer.close()
 
 
 def main():
     """Main entry point."""
     print("=" * 60)
-    print("  Gladys - Web Interface with PyAudio")
+    print("  Gladys - Web Interface")
     print("  Powered by Mistral AI & Gradio")
     print("=" * 60)
 
@@ -1,9 +1,11 @@
 """Memory management for conversation history."""
-import json
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
-from config import MEMORY_FILE, MEMORY_THRESHOLD_KB, MEMORY_KEEP_LAST_N
+import orjson
+from typing import List, Dict, Any, Optional
+from config import MEMORY_FILE, MEMORY_THRESHOLD_KB, MEMORY_KEEP_LAST_N, MEMORY_MAX_TOKENS
 
 
 def load_memory() -> List[Dict[str, Any]]:
@@ -16,9 +18,9 @@ def load_memory() -> List[Dict[str, Any]]:
         return []
 
     try:
-        with open(MEMORY_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+        with open(MEMORY_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except orjson.JSONDecodeError:
         print(f"Warning: Could not parse {MEMORY_FILE}, starting fresh", file=sys.stderr)
         return []
     except Exception as e:
@@ -33,12 +35,54 @@ def save_memory(messages: List[Dict[str, Any]]) -> None:
         messages: List of message dictionaries to save
     """
     try:
-        with open(MEMORY_FILE, 'w') as f:
-            json.dump(messages, f, indent=2)
+        with open(MEMORY_FILE, 'wb') as f:
+            f.write(orjson.dumps(messages, option=orjson.OPT_INDENT_2))
     except Exception as e:
         print(f"Error saving memory: {e}", file=sys.stderr)
 
 
+class MemoryWriter:
+    """Save conversation history on a single background thread.
+
+    Saves never overlap and only the latest snapshot matters: a save
+    requested while another is in flight is written right after it, and
+    intermediate snapshots are skipped.
+    """
+
+    def __init__(self):
+        """Start the writer thread pool."""
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._pending = None
+        self._running = False
+
+    def save(self, messages: List[Dict[str, Any]]) -> None:
+        """Schedule a save without blocking the caller.
+
+        Args:
+            messages: List of message dictionaries to save
+        """
+        with self._lock:
+            # Copy so later appends by the caller don't race with serialization
+            self._pending = list(messages)
+            if not self._running:
+                self._running = True
+                self._executor.submit(self._run)
+
+    def close(self) -> None:
+        """Wait for the last scheduled save to be written."""
+        self._executor.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                messages, self._pending = self._pending, None
+                if messages is None:
+                    self._running = False
+                    return
+            save_memory(messages)
+
+
 def get_memory_size_kb(messages: List[Dict[str, Any]]) -> float:
     """Calculate the size of conversation history in KB.
 
@@ -48,8 +92,7 @@ def get_memory_size_kb(messages: List[Dict[str, Any]]) -> float:
     Returns:
         Size in kilobytes
     """
-    json_str = json.dumps(messages)
-    size_bytes = len(json_str.encode('utf-8'))
+    size_bytes = len(orjson.dumps(messages))
     return size_bytes / 1024
 
 
@@ -66,6 +109,88 @@ def should_summarize(messages: List[Dict[str, Any]]) -> bool:
     return size_kb > MEMORY_THRESHOLD_KB
 
 
+def estimate_tokens(message: Dict[str, Any]) -> int:
+    """Approximate the token count of a message (~4 characters per token).
+
+    Args:
+        message: Message dictionary
+
+    Returns:
+        Estimated number of tokens
+    """
+    return len(str(message.get("content") or "")) // 4
+
+
+def trim_history(
+    messages: List[Dict[str, Any]],
+    max_tokens: int = MEMORY_MAX_TOKENS,
+    trim_to_tokens: Optional[int] = None
+) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split history into an evicted prefix and a recent window within budget.
+
+    Nothing is evicted until the history exceeds max_tokens; it is then cut
+    down to trim_to_tokens, so the following turns fit again and the
+    summarization call only happens once in a while.
+
+    The recent window always starts on a user message so tool calls stay
+    with their results, and always includes the latest user message.
+    Existing summary (system) messages are not counted: they are evicted
+    along with the oldest turns so they can be folded into a new summary.
+
+    Args:
+        messages: List of message dictionaries
+        max_tokens: Approximate token budget that triggers trimming
+        trim_to_tokens: Budget for the recent window once trimming, half of
+            max_tokens by default
+
+    Returns:
+        Tuple of (evicted, recent); evicted is empty if everything fits
+    """
+    if sum(estimate_tokens(msg) for msg in messages if msg.get("role") != "system") <= max_tokens:
+        return [], messages
+
+    if trim_to_tokens is None:
+        trim_to_tokens = max_tokens // 2
+
+    total = 0
+    start = None
+
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].get("role") == "system":
+            continue
+
+        total += estimate_tokens(messages[i])
+        if total > trim_to_tokens:
+            break
+
+        if messages[i].get("role") == "user":
+            start = i
+
+    if start is None:
+        # Even the latest turn alone is over budget, keep it anyway
+        start = next(
+            (i for i in range(len(messages) - 1, -1, -1) if messages[i].get("role") == "user"),
+            len(messages) - 1
+        )
+
+    return messages[:start], messages[start:]
+
+
+def create_summary_message(summary: str) -> Dict[str, Any]:
+    """Create the system message that stands in for summarized history.
+
+    Args:
+        summary: Summary text
+
+    Returns:
+        Summary message dictionary
+    """
+    return {
+        "role": "system",
+        "content": f"[Previous conversation summary]: {summary}"
+    }
+
+
 def create_summary_request(messages: List[Dict[str, Any]], summarization_prompt: str) -> str:
     """Create a summarization request from conversation history.
 
@@ -105,10 +230,7 @@ def compress_memory(messages: List[Dict[str, Any]], summary: str) -> List[Dict[s
         Compressed list with summary + last N messages
     """
     # Create summary message
-    summary_message = {
-        "role": "system",
-        "content": f"[Previous conversation summary]: {summary}"
-    }
+    summary_message = create_summary_message(summary)
 
     # Keep last N messages
     recent_messages = messages[-MEMORY_KEEP_LAST_N:] if len(messages) > MEMORY_KEEP_LAST_N else messages
@@ -0,0 +1,51 @@
+"""Pooled HTTP client shared by the services that talk to HTTP APIs."""
+import atexit
+import threading
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Return the process-wide HTTP/2 client, created on first use.
+
+    Requests made through it reuse pooled TLS connections instead of
+    paying a new handshake each time.
+
+    Returns:
+        httpx.Client, closed automatically at interpreter exit
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            import httpx
+
+            _client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+            atexit.register(close)
+        return _client
+
+
+def warm_up(url: str) -> None:
+    """Open a pooled connection to url ahead of the first real request.
+
+    Args:
+        url: Any URL on the host to connect to
+    """
+    import httpx
+
+    try:
+        get_shared_client().head(url, timeout=2)
+    except httpx.HTTPError:
+        pass
+
+
+def close() -> None:
+    """Close the shared client, a later call to get_shared_client opens a new one."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -1,3 +1,6 @@
+import asyncio
+import atexit
+import threading
 from browser_use import Agent, ChatGoogle, Browser
 from dotenv import load_dotenv
 import sys
@@ -5,17 +8,39 @@ import sys
 
 load_dotenv()
 
+# Shared across tasks so Chromium and the LLM client are only created once
+_llm = None
+_browser = None
+_loop = None
+_lock = threading.Lock()
+
+
+def _close_browser():
+    """Ferme le navigateur partagé à la sortie du programme"""
+    _loop.run_until_complete(_browser.kill())
+    _loop.close()
+
 
 def run_task(task_description):
     """Exécute une tâche avec Browser Use"""
-    browser = Browser(keep_alive=True)
-    agent = Agent(
-        task=task_description,
-        llm=ChatGoogle(model="gemini-2.5-flash"),
-        browser_session=browser
-    )
-    result = agent.run_sync()
-    return result
+    global _llm, _browser, _loop
+
+    with _lock:
+        if _browser is None:
+            _llm = ChatGoogle(model="gemini-2.5-flash")
+            _browser = Browser(keep_alive=True)
+            # The browser session is bound to the event loop it started on,
+            # so every task runs on this one rather than a new asyncio.run loop
+            _loop = asyncio.new_event_loop()
+            atexit.register(_close_browser)
+
+        agent = Agent(
+            task=task_description,
+            llm=_llm,
+            browser_session=_browser
+        )
+        result = _loop.run_until_complete(agent.run())
+        return result
 
 
 def execute_browser_task(task_description, expected_result):
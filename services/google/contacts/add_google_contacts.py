@@ -1,4 +1,6 @@
 import os
+import re
+from functools import lru_cache
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -8,6 +10,16 @@ from config import GOOGLE_CONTACTS_CREDENTIALS, GOOGLE_ADD_CONTACTS_TOKEN
 # Scopes requis pour accéder aux contacts
 SCOPES = ['https://www.googleapis.com/auth/contacts']
 
+# Modèles pour extraire les informations, compilés une seule fois
+_NAME_RE = re.compile(r"Nom\s*:\s*(.+)", re.IGNORECASE)
+_EMAIL_RE = re.compile(r"Email\s*:\s*(\S+)", re.IGNORECASE)
+_PHONE_RE = re.compile(r"Phone\s*:\s*(\+?\d+)", re.IGNORECASE)
+
+# Nombre maximal de contacts par appel à batchCreateContacts
+BATCH_SIZE = 200
+
+# Créé une seule fois pour réutiliser la même connexion HTTP
+@lru_cache(maxsize=None)
 def authenticate_google_contacts():
     """
     Authentifie avec l'API Google et retourne un objet service pour Google People.
@@ -43,42 +55,64 @@ def authenticate_google_contacts():
             token.write(creds.to_json())
         print("Authentification terminée et enregistrée")
 
-    # Créer le service Google People
-    return build('people', 'v1', credentials=creds)
+    # Rafraîchir en arrière-plan le token bientôt expiré, sans bloquer les appels
+    creds.with_non_blocking_refresh()
 
-def create_google_contact(name, email, phone):
-    service = authenticate_google_contacts()
+    # Créer le service Google People
+    return build('people', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
 
-    contact_body = {
+def build_contact_person(name, email, phone):
+    """
+    Construit la ressource Person envoyée à l'API People.
+    """
+    return {
         "names": [{"givenName": name}],
         "emailAddresses": [{"value": email}],
         "phoneNumbers": [{"value": phone}]
     }
 
+def create_google_contacts_batch(contacts):
+    """
+    Crée plusieurs contacts avec people.batchCreateContacts, par lots de BATCH_SIZE.
+    contacts est une liste de dicts avec les clés name, email et phone.
+    Retourne les resourceName des contacts créés.
+    """
+    service = authenticate_google_contacts()
+    created = []
+
     try:
-        contact = service.people().createContact(body=contact_body).execute()
-        print(f"Contact créé : {contact.get('resourceName')}")
-        return True
+        for start in range(0, len(contacts), BATCH_SIZE):
+            chunk = contacts[start:start + BATCH_SIZE]
+            response = service.people().batchCreateContacts(body={
+                "contacts": [
+                    {"contactPerson": build_contact_person(c["name"], c.get("email"), c.get("phone"))}
+                    for c in chunk
+                ],
+                "readMask": "names"
+            }).execute()
+
+            for person in response.get("createdPeople", []):
+                resource_name = person.get("person", {}).get("resourceName")
+                print(f"Contact créé : {resource_name}")
+                created.append(resource_name)
+        return created
     except Exception as e:
         print(f"Erreur lors de la création du contact : {e}")
         raise
 
-import re
+def create_google_contact(name, email, phone):
+    create_google_contacts_batch([{"name": name, "email": email, "phone": phone}])
+    return True
 
 def extract_contact_details(contact_info):
     """
     Extrait le nom, l'email et le numéro de téléphone d'un contact.
     """
 
-    # Modèles pour extraire les informations
-    name_pattern = r"Nom\s*:\s*(.+)"
-    email_pattern = r"Email\s*:\s*(\S+)"
-    phone_pattern = r"Phone\s*:\s*(\+?\d+)"
-
     # Recherche des informations
-    name_match = re.search(name_pattern, contact_info, re.IGNORECASE)
-    email_match = re.search(email_pattern, contact_info, re.IGNORECASE)
-    phone_match = re.search(phone_pattern, contact_info, re.IGNORECASE)
+    name_match = _NAME_RE.search(contact_info)
+    email_match = _EMAIL_RE.search(contact_info)
+    phone_match = _PHONE_RE.search(contact_info)
 
     # Extraction avec gestion des cas où un champ est manquant
     name = name_match.group(1).strip() if name_match else None
@@ -1,5 +1,6 @@
 import json
 import os
+from functools import lru_cache
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -9,6 +10,11 @@ from config import GOOGLE_CONTACTS_CREDENTIALS, GOOGLE_CONTACTS_TOKEN
 # Scopes requis pour accéder aux contacts
 SCOPES = ['https://www.googleapis.com/auth/contacts.readonly']
 
+# Taille de page maximale acceptée par connections.list
+PAGE_SIZE = 1000
+
+# Créé une seule fois pour réutiliser la même connexion HTTP
+@lru_cache(maxsize=None)
 def authenticate_google():
     """
     Authentifie avec l'API Google et retourne un objet service pour Google People.
@@ -53,32 +59,42 @@ def authenticate_google():
             token.write(creds.to_json())
         print("Authentification terminée et enregistrée")
 
+    # Rafraîchir en arrière-plan le token bientôt expiré, sans bloquer les appels
+    creds.with_non_blocking_refresh()
+
     # Créer le service Google People
-    return build('people', 'v1', credentials=creds)
+    return build('people', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
 
-def get_google_contacts():
+def iter_google_contacts():
+    """
+    Parcourt les contacts Google page par page et les produit un par un.
+    """
     service = authenticate_google()
+    page_token = None
 
-    # Récupération des contacts
-    results = service.people().connections().list(
-        resourceName='people/me',
-        pageSize=2000,  # Nombre maximum de contacts à récupérer
-        personFields='names,emailAddresses,phoneNumbers'
-    ).execute()
-
-    contacts = results.get('connections', [])
-
-    # Extraction des informations pertinentes
-    contact_list = []
-    for contact in contacts:
-        contact_info = {
-            'name': contact.get('names', [{}])[0].get('displayName', 'Inconnu'),
-            'email': contact.get('emailAddresses', [{}])[0].get('value', 'Non fourni'),
-            'phone': contact.get('phoneNumbers', [{}])[0].get('value', 'Non fourni')
-        }
-        contact_list.append(contact_info)
-
-    return contact_list
+    while True:
+        # Récupération d'une page de contacts
+        results = service.people().connections().list(
+            resourceName='people/me',
+            pageSize=PAGE_SIZE,
+            pageToken=page_token,
+            personFields='names,emailAddresses,phoneNumbers'
+        ).execute()
+
+        # Extraction des informations pertinentes
+        for contact in results.get('connections', []):
+            yield {
+                'name': contact.get('names', [{}])[0].get('displayName', 'Inconnu'),
+                'email': contact.get('emailAddresses', [{}])[0].get('value', 'Non fourni'),
+                'phone': contact.get('phoneNumbers', [{}])[0].get('value', 'Non fourni')
+            }
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+def get_google_contacts():
+    return list(iter_google_contacts())
 
 if __name__ == '__main__':
     contacts = get_google_contacts()
@@ -1,14 +1,18 @@
 import os
 import base64
-import json
+import multiprocessing
 import re
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+import orjson
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
-from typing import List, Dict
+from typing import Dict, Iterator, List
 from config import GOOGLE_GMAIL_ACCESS_CREDENTIALS, GOOGLE_GMAIL_ACCESS_TOKEN
 
 # Define the required scopes for Gmail API
@@ -17,10 +21,44 @@ SCOPES = ["https://www.googleapis.com/auth/gmail.readonly", "https://www.googlea
 # Fenêtre de recherche en jours
 DAYS_WINDOW = 7  # 7 derniers jours
 
+# Sub-requests packed into one Gmail batch HTTP request, Gmail starts
+# rate limiting sub-requests in larger batches
+BATCH_SIZE = 50
 
-def authenticate_gmail():
+# Rate-limited sub-requests are sent again in a new batch, waiting
+# RETRY_DELAY seconds then doubling before each retry
+MAX_RETRIES = 4
+RETRY_DELAY = 1.0
+
+# Partial response: only the headers and text parts parse_message reads
+MESSAGE_FIELDS = "id,payload(headers,mimeType,body/data,parts(mimeType,body/data,parts))"
+
+# Largest page messages.list allows, and only the fields we read from it
+LIST_PAGE_SIZE = 500
+LIST_FIELDS = "messages/id,nextPageToken"
+
+# Parsing runs in a process pool from this many messages on, smaller
+# fetches are not worth the worker startup
+PARALLEL_PARSE_MIN = 1000
+PARSE_CHUNKSIZE = 32
+
+# Headers kept by parse_message, lowercased
+HEADER_NAMES = {"from", "subject", "date"}
+
+# Body cleanup in one pass: runs of 3+ line breaks, Windows line endings,
+# then any remaining HTML tag. Tags may sit anywhere inside a run or
+# between \r and \n, since stripping them first would join those up
+BODY_CLEANUP = re.compile(
+    r"(?P<gap>(?:(?:<[^>]+>)*\r?(?:<[^>]+>)*\n){3,})|(?P<crlf>\r(?:<[^>]+>)*\n)|<[^>]+>"
+)
+
+# Same without tag removal, for text/plain bodies that cannot contain HTML
+PLAIN_BODY_CLEANUP = re.compile(r"(?P<gap>(?:\r?\n){3,})|(?P<crlf>\r\n)")
+
+
+def get_credentials():
     """
-    Authenticate with Gmail API and return a service object.
+    Load Gmail OAuth credentials, refreshing or creating them if needed.
     Reuses existing token.json if available.
     """
     creds = None
@@ -62,9 +100,24 @@ def authenticate_gmail():
             token.write(creds.to_json())
         if __name__ == '__main__':
             print("New authentication completed and saved")
-    
+
+    return creds
+
+
+# Built once per process so later calls reuse the same HTTP connection
+@lru_cache(maxsize=None)
+def authenticate_gmail():
+    """
+    Authenticate with Gmail API and return a service object.
+    """
+    creds = get_credentials()
+
+    # Refresh tokens close to expiry in the background instead of
+    # blocking the next API call
+    creds.with_non_blocking_refresh()
+
     # Create the Gmail service
-    service = build("gmail", "v1", credentials=creds)
+    service = build("gmail", "v1", credentials=creds, static_discovery=True, cache_discovery=False)
     return service
 
 
@@ -83,7 +136,9 @@ def list_messages(service, query: str = "") -> List[Dict]:
     try:
         if __name__ == '__main__':
             print("Fetching email list...")
-        response = service.users().messages().list(userId="me", q=query).execute()
+        response = service.users().messages().list(
+            userId="me", q=query, maxResults=LIST_PAGE_SIZE, fields=LIST_FIELDS
+        ).execute()
         
         while "messages" in response:
             batch_size = len(response["messages"])
@@ -94,7 +149,9 @@ def list_messages(service, query: str = "") -> List[Dict]:
             # Check if there is another page of messages
             if "nextPageToken" in response:
                 page_token = response["nextPageToken"]
-                response = service.users().messages().list(userId="me", q=query, pageToken=page_token).execute()
+                response = service.users().messages().list(
+                    userId="me", q=query, maxResults=LIST_PAGE_SIZE, fields=LIST_FIELDS, pageToken=page_token
+                ).execute()
             else:
                 break  # No more messages
         if __name__ == '__main__':      
@@ -123,54 +180,204 @@ def get_message_details(service, msg_id: str, index: int, total: int) -> Dict:
         if index % 10 == 0:  # Show progress every 10 emails
             print(f"Processing email {index}/{total}...")
             
-        msg = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-        headers = msg["payload"]["headers"]
-
-        # Extract required fields
-        email_data = {
-            "id": msg_id,
-            "sender": next((h["value"] for h in headers if h["name"].lower() == "from"), "Unknown"),
-            "subject": next((h["value"] for h in headers if h["name"].lower() == "subject"), "No Subject"),
-            "date": next((h["value"] for h in headers if h["name"].lower() == "date"), "Unknown"),
-            "body": extract_email_body(msg),
-        }
-        return email_data
+        msg = service.users().messages().get(userId="me", id=msg_id, format="full", fields=MESSAGE_FIELDS).execute()
+        return parse_message(msg)
     except Exception as e:
         if __name__ == '__main__':
             print(f"Error fetching email details for message {index}/{total} (ID: {msg_id}): {e}")
-        return {
-            "id": msg_id,
-            "error": str(e),
-            "sender": "Error",
-            "subject": "Error retrieving email",
-            "date": "Unknown",
-            "body": "Error retrieving email body"
-        }
+        return error_details(msg_id, e)
 
 
-def clean_email_body(text: str) -> str:
+def parse_message(msg) -> Dict:
+    """
+    Extract the fields we keep from a Gmail message resource.
+
+    Args:
+        msg: Gmail message object fetched with format="full".
+
+    Returns:
+        Dictionary containing email details (sender, subject, date, body).
+    """
+    # One pass over the headers, keeping the first occurrence of each
+    headers = {}
+    for header in msg["payload"]["headers"]:
+        name = header["name"].lower()
+        if name in HEADER_NAMES and name not in headers:
+            headers[name] = header["value"]
+
+    # Extract required fields
+    return {
+        "id": msg["id"],
+        "sender": headers.get("from", "Unknown"),
+        "subject": headers.get("subject", "No Subject"),
+        "date": headers.get("date", "Unknown"),
+        "body": extract_email_body(msg),
+    }
+
+
+def _parse_or_error(msg) -> Dict:
+    """parse_message, returning error details for a malformed message instead of raising."""
+    try:
+        return parse_message(msg)
+    except Exception as e:
+        return error_details(msg.get("id", "Unknown"), e)
+
+
+def error_details(msg_id: str, error: Exception) -> Dict:
+    """Placeholder details for a message that could not be retrieved."""
+    return {
+        "id": msg_id,
+        "error": str(error),
+        "sender": "Error",
+        "subject": "Error retrieving email",
+        "date": "Unknown",
+        "body": "Error retrieving email body"
+    }
+
+
+def iter_message_details(service, message_ids: List[str]) -> Iterator[Dict]:
+    """
+    Fetch and parse emails with Gmail batch requests, yielding as they arrive.
+
+    Up to BATCH_SIZE messages.get calls are sent in a single multipart
+    request. From PARALLEL_PARSE_MIN messages on, parsing is spread over a
+    process pool and overlaps with fetching the next batch, so at most two
+    batches of emails are held in memory.
+
+    Args:
+        service: Authenticated Gmail service.
+        message_ids: IDs of the messages to retrieve.
+
+    Yields:
+        Email details in the same order as message_ids.
+    """
+    if len(message_ids) < PARALLEL_PARSE_MIN or (os.cpu_count() or 1) < 2:
+        yield from _iter_batches(service, message_ids, map)
+        return
+
+    # Forking a process that runs other threads (tool event loop, Gradio,
+    # PyAudio) can leave a child stuck on a lock copied mid-use
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as executor:
+        yield from _iter_batches(service, message_ids, partial(executor.map, chunksize=PARSE_CHUNKSIZE))
+
+
+def _iter_batches(service, message_ids: List[str], parse_map) -> Iterator[Dict]:
+    previous = None
+    for start in range(0, len(message_ids), BATCH_SIZE):
+        end = min(start + BATCH_SIZE, len(message_ids))
+        messages, errors = _fetch_batch(service, message_ids, start, end)
+
+        if __name__ == '__main__':
+            print(f"Processed {end}/{len(message_ids)} emails...", file=sys.stderr)
+
+        # Queue this batch for parsing, then hand out the previous one
+        order = [index for index in range(start, end) if index in messages]
+        parsed = parse_map(_parse_or_error, [messages[index] for index in order])
+        if previous is not None:
+            yield from _merge_batch(*previous)
+        previous = (start, end, order, parsed, errors)
+
+    if previous is not None:
+        yield from _merge_batch(*previous)
+
+
+def _fetch_batch(service, message_ids: List[str], start: int, end: int):
+    """Execute one batch request, returning raw messages and error details by index."""
+    messages = {}
+    errors = {}
+    pending = list(range(start, end))
+
+    for attempt in range(MAX_RETRIES + 1):
+        throttled = []
+
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            if exception is None:
+                messages[index] = response
+            elif attempt < MAX_RETRIES and _is_rate_limited(exception):
+                throttled.append(index)
+            else:
+                if __name__ == '__main__':
+                    print(f"Error fetching email details for message ID {message_ids[index]}: {exception}", file=sys.stderr)
+                errors[index] = error_details(message_ids[index], exception)
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for index in pending:
+            batch.add(
+                service.users().messages().get(
+                    userId="me",
+                    id=message_ids[index],
+                    format="full",
+                    fields=MESSAGE_FIELDS
+                ),
+                request_id=str(index)
+            )
+
+        try:
+            batch.execute()
+        except Exception as e:
+            # The whole request failed, keep what the other batches fetched
+            if __name__ == '__main__':
+                print(f"Error executing batch {start}-{end}: {e}", file=sys.stderr)
+            for index in pending:
+                if index not in messages and index not in errors:
+                    errors[index] = error_details(message_ids[index], e)
+            break
+
+        if not throttled:
+            break
+        time.sleep(RETRY_DELAY * 2 ** attempt)
+        pending = sorted(throttled)
+
+    return messages, errors
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Whether a sub-request failed because Gmail throttled it."""
+    if not isinstance(error, HttpError):
+        return False
+    return error.resp.status == 429 or "ratelimitexceeded" in str(error).lower()
+
+
+def _merge_batch(start: int, end: int, order: List[int], parsed, errors: Dict[int, Dict]) -> Iterator[Dict]:
+    email_details = dict(zip(order, parsed))
+    email_details.update(errors)
+    for index in range(start, end):
+        yield email_details[index]
+
+
+def clean_email_body(text: str, is_html: bool = True) -> str:
     """
     Clean and normalize email body text.
 
     Args:
         text: Raw email body text.
+        is_html: Whether the body may contain HTML tags to strip.
 
     Returns:
         Cleaned email body text.
     """
-    # Remove HTML tags if present
-    text = re.sub(r'<[^>]+>', '', text)
+    # Cheap substring checks first: without '<' there is no tag to strip,
+    # and without '\r' or three newlines there is nothing else to replace
+    if is_html and "<" not in text:
+        is_html = False
 
-    # Replace \r\n with \n
-    text = text.replace('\r\n', '\n')
-
-    # Remove excessive whitespace
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    # Remove HTML tags, replace \r\n with \n and collapse excessive
+    # blank lines, all in a single substitution
+    if is_html or "\r" in text or "\n\n\n" in text:
+        cleanup = BODY_CLEANUP if is_html else PLAIN_BODY_CLEANUP
+        text = cleanup.sub(_replace_body_match, text)
 
     # Remove leading/trailing whitespace
-    text = text.strip()
+    return text.strip()
+
 
-    return text
+def _replace_body_match(match) -> str:
+    if match.group("gap"):
+        return "\n\n"
+    if match.group("crlf"):
+        return "\n"
+    return ""
 
 
 def extract_email_body(msg) -> str:
@@ -192,7 +399,7 @@ def extract_email_body(msg) -> str:
             if "data" in payload.get("body", {}):
                 body_data = payload["body"]["data"]
                 raw_body = base64.urlsafe_b64decode(body_data.encode("ASCII")).decode("utf-8", errors="replace").strip()
-                return clean_email_body(raw_body)
+                return clean_email_body(raw_body, is_html=payload.get("mimeType") != "text/plain")
             return "No body content available."
 
         # Function to recursively search for text parts
@@ -215,16 +422,16 @@ def extract_email_body(msg) -> str:
         # Find a text part in the message
         text_data = find_text_part(payload["parts"])
 
-        # If we found text data, decode it
+        # If we found text data, decode it, plain text has no tags to strip
         if text_data:
             raw_body = base64.urlsafe_b64decode(text_data.encode("ASCII")).decode("utf-8", errors="replace").strip()
-            return clean_email_body(raw_body)
+            return clean_email_body(raw_body, is_html=False)
 
         # If no plain text was found, try to use the first part's data as fallback
         if "data" in payload["parts"][0].get("body", {}):
             body_data = payload["parts"][0]["body"]["data"]
             raw_body = base64.urlsafe_b64decode(body_data.encode("ASCII")).decode("utf-8", errors="replace").strip()
-            return clean_email_body(raw_body)
+            return clean_email_body(raw_body, is_html=payload["parts"][0].get("mimeType") != "text/plain")
 
         return "No text content found in this email."
 
@@ -233,37 +440,32 @@ def extract_email_body(msg) -> str:
     
 
 
-def access_gmail():
-    """Main function to run the Gmail API operations with no user input."""
-    try:
-        # Authenticate and get service
-        service = authenticate_gmail()
-        print("Successfully connected to Gmail API!")
-
-        # Requête: uniquement reçus dans l'inbox, pas envoyés par moi, et sur les 7 derniers jours
-        query = f"in:inbox -from:me newer_than:{DAYS_WINDOW}d"
+def iter_gmail_messages() -> Iterator[Dict]:
+    """Yield the details of each inbox email from the last DAYS_WINDOW days."""
+    # Authenticate and get service
+    service = authenticate_gmail()
+    print("Successfully connected to Gmail API!", file=sys.stderr)
 
-        # Fetch all messages
-        messages = list_messages(service, query=query)
+    # Requête: uniquement reçus dans l'inbox, pas envoyés par moi, et sur les 7 derniers jours
+    query = f"in:inbox -from:me newer_than:{DAYS_WINDOW}d"
 
-        if not messages:
-            if __name__ == '__main__':
-                print("No emails found in your account for the last 7 days.")
-            return []
+    # Fetch all messages
+    messages = list_messages(service, query=query)
 
-        # Process all emails
-        email_details = []
-        total_messages = len(messages)
+    if not messages:
+        if __name__ == '__main__':
+            print("No emails found in your account for the last 7 days.", file=sys.stderr)
+        return
 
-        print(f"Starting to process {total_messages} emails...")
-        for i, msg in enumerate(messages):
-            details = get_message_details(service, msg["id"], i+1, total_messages)
-            email_details.append(details)
+    # Process all emails
+    print(f"Starting to process {len(messages)} emails...", file=sys.stderr)
+    yield from iter_message_details(service, [msg["id"] for msg in messages])
 
-        if __name__ == '__main__':
-            print(json.dumps(email_details, indent=2, ensure_ascii=False))
 
-        return email_details
+def access_gmail():
+    """Main function to run the Gmail API operations with no user input."""
+    try:
+        return list(iter_gmail_messages())
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -271,4 +473,6 @@ def access_gmail():
 
 
 if __name__ == "__main__":
-    access_gmail()
+    # One JSON object per line, written as soon as each batch is parsed
+    for details in iter_gmail_messages():
+        sys.stdout.buffer.write(orjson.dumps(details) + b"\n")
@@ -1,14 +1,27 @@
 import base64
 import os
 import re
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from functools import lru_cache
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from config import GOOGLE_GMAIL_ACCESS_CREDENTIALS, GOOGLE_GMAIL_ACCESS_TOKEN, GMAIL_MAIL_USER, GMAIL_MAIL_TEST_RECIPIENT
 
+# Tolérer espaces classiques + insécables + fine-insécables, et le deux-points pleine chasse
+_SPACE = r"[ \t\u00A0\u202F]*"
+
+# Motifs compilés une seule fois pour extract_email_details
+_TO_RE = re.compile(rf"(?mi)^\s*(A|To){_SPACE}:{_SPACE}(.+)$")
+_SUBJ_RE = re.compile(rf"(?mi)^\s*(Objet|Subject){_SPACE}:{_SPACE}(.+)$")
+_BODY_RE = re.compile(rf"(?ms)^\s*(Corps|Body){_SPACE}:{_SPACE}(.*)$")
+_SOUHAITEZ_RE = re.compile(r"(?i)(Souhaitez[\s–—-]*vous|Would[\s–—-]*you[\s–—-]*like).*")
+
+# Étiquettes reconnues par le chemin rapide, en minuscules
+_DRAFT_LABELS = {"a": "to", "to": "to", "objet": "subject", "subject": "subject", "corps": "body", "body": "body"}
+
+# Créé une seule fois pour réutiliser la même connexion HTTP
+@lru_cache(maxsize=None)
 def authenticate_gmail():
     """Authentifie l'utilisateur auprès de l'API Gmail."""
     SCOPES = ['https://www.googleapis.com/auth/gmail.send']
@@ -29,19 +42,53 @@ def authenticate_gmail():
         with open(token_file, "w") as token:
             token.write(creds.to_json())
 
-    return build("gmail", "v1", credentials=creds)
+    # Rafraîchir en arrière-plan le token bientôt expiré, sans bloquer les appels
+    creds.with_non_blocking_refresh()
+
+    return build("gmail", "v1", credentials=creds, static_discovery=True, cache_discovery=False)
+
+def _encode_header(value: str) -> str:
+    """Encode une valeur d'en-tête en RFC 2047 uniquement si elle n'est pas en ASCII."""
+    if value.isascii():
+        return value
+    # Importé ici : le paquet email n'est chargé que pour les en-têtes non ASCII
+    from email.header import Header
+    # Les lignes repliées doivent finir en CRLF comme le reste du message
+    return Header(value, "utf-8").encode(linesep="\r\n")
+
+def _encode_addresses(value: str) -> str:
+    """Encode les noms affichés non ASCII d'une liste d'adresses, sans toucher aux adresses."""
+    if value.isascii():
+        return value
+    from email.utils import formataddr, getaddresses
+    return ", ".join(formataddr(address) for address in getaddresses([value]))
+
+def _check_header(name: str, value: str) -> None:
+    """Refuse un retour à la ligne dans un en-tête, qui permettrait d'en injecter d'autres."""
+    if "\r" in value or "\n" in value:
+        raise ValueError(f"En-tête {name} invalide : retour à la ligne interdit")
+
+def build_raw_message(sender, to, subject, body) -> str:
+    """Construit directement le message RFC 822 en texte brut, encodé en base64url."""
+    _check_header("To", to)
+    _check_header("From", sender)
+    _check_header("Subject", subject)
+
+    message = (
+        f"To: {_encode_addresses(to)}\r\n"
+        f"From: {_encode_addresses(sender)}\r\n"
+        f"Subject: {_encode_header(subject)}\r\n"
+        "MIME-Version: 1.0\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        "Content-Transfer-Encoding: 8bit\r\n"
+        "\r\n"
+        f"{body}"
+    )
+    return base64.urlsafe_b64encode(message.encode("utf-8")).decode("ascii")
 
 def send_email(service, sender, to, subject, body):
     """Envoie un e-mail avec l'API Gmail."""
-    message = MIMEMultipart()
-    message['to'] = to
-    message['from'] = sender
-    message['subject'] = subject
-
-    msg = MIMEText(body)
-    message.attach(msg)
-
-    raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    raw_message = build_raw_message(sender, to, subject, body)
 
     try:
         send_message = service.users().messages().send(userId="me", body={'raw': raw_message}).execute()
@@ -49,6 +96,30 @@ def send_email(service, sender, to, subject, body):
     except Exception as e:
         print("Erreur lors de l'envoi de l'email :", e)
 
+def _split_draft_lines(t: str):
+    """
+    Chemin rapide sans regex : une seule passe sur les lignes avec str.partition.
+    Retourne None si un des champs manque, pour laisser les regex trancher.
+    """
+    fields = {}
+    lines = t.split("\n")
+    for i, line in enumerate(lines):
+        label, sep, value = line.partition(":")
+        field = _DRAFT_LABELS.get(label.strip().lower()) if sep else None
+        if field is None or field in fields:
+            continue
+
+        if field == "body":
+            # Tout ce qui suit, y compris si ça commence sur la même ligne
+            fields["body"] = "\n".join([value] + lines[i + 1:])
+            break
+        if value:
+            fields[field] = value
+
+    if len(fields) < 3:
+        return None
+    return fields["to"].strip(), fields["subject"].strip(), fields["body"].strip()
+
 def extract_email_details(draft: str):
     """
     Extrait (destinataire, sujet, corps) d'un brouillon tolérant :
@@ -58,28 +129,30 @@ def extract_email_details(draft: str):
     - Retire toute phrase finale du type "Souhaitez-vous que je l'envoie tel quel..." ajoutée par l'assistant.
     """
     t = draft or ""
-    # Tolérer espaces classiques + insécables + fine-insécables, et le deux-points pleine chasse
-    space = r"[ \t\u00A0\u202F]*"
 
-    # A / To (French/English)
-    m_to = re.search(rf"(?mi)^\s*(A|To){space}:{space}(.+)$", t)
-    # Objet / Subject (French/English)
-    m_subj = re.search(rf"(?mi)^\s*(Objet|Subject){space}:{space}(.+)$", t)
+    details = _split_draft_lines(t)
+    if details is not None:
+        to, subject, body = details
+    else:
+        # A / To (French/English)
+        m_to = _TO_RE.search(t)
+        # Objet / Subject (French/English)
+        m_subj = _SUBJ_RE.search(t)
 
-    # Corps / Body : capturer TOUT ce qui suit, y compris si ça commence sur la même ligne
-    # (?m) = multiline (^/$ par ligne), (?s) = dotall ('.' inclut les retours ligne)
-    m_body = re.search(rf"(?ms)^\s*(Corps|Body){space}:{space}(.*)$", t)
+        # Corps / Body : capturer TOUT ce qui suit, y compris si ça commence sur la même ligne
+        # (?m) = multiline (^/$ par ligne), (?s) = dotall ('.' inclut les retours ligne)
+        m_body = _BODY_RE.search(t)
 
-    if not (m_to and m_subj and m_body):
-        raise ValueError("Invalid or incomplete draft format (To/Subject/Body or A/Objet/Corps not found).")
+        if not (m_to and m_subj and m_body):
+            raise ValueError("Invalid or incomplete draft format (To/Subject/Body or A/Objet/Corps not found).")
 
-    to = m_to.group(2).strip()
-    subject = m_subj.group(2).strip()
-    body = m_body.group(2).strip()
+        to = m_to.group(2).strip()
+        subject = m_subj.group(2).strip()
+        body = m_body.group(2).strip()
 
     # Supprimer la question finale ajoutée par le bot, si présente
     # On enlève à partir de "Souhaitez-vous..." ou "Would you like..." (toutes variantes possibles)
-    body = re.split(r"(?i)(Souhaitez[\s–—-]*vous|Would[\s–—-]*you[\s–—-]*like).*", body)[0].rstrip()
+    body = _SOUHAITEZ_RE.split(body)[0].rstrip()
 
     return to, subject, body
 
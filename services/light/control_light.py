@@ -2,70 +2,198 @@ from tapo import ApiClient
 from tapo.requests import Color
 import os
 import asyncio
+import atexit
+import time
 from config import TAPO_USERNAME, TAPO_PASSWORD, TAPO_IP_ADDRESS
-    
+
+# Actions à valeur fixe, avec leur réponse déjà construite
+_BRIGHTNESS_PRESETS = {
+    "brightness_min": (30, "🔆 Luminosité réglée à 30%"),
+    "brightness_moyenne": (50, "🔆 Luminosité réglée à 50%"),
+    "brightness_max": (100, "🔆 Luminosité réglée à 100%"),
+}
+
+_COLORS = {
+    "color_indigo": Color.Indigo,
+    "color_blue": Color.Azure,
+    "color_rouge": Color.DarkRed,
+    "color_violet": Color.BlueViolet,
+    "color_vert": Color.ForestGreen,
+    "color_rose": Color.Pink,
+    "color_white": Color.CoolWhite,
+    "color_warm": Color.WarmWhite,
+}
+
+_ON_RESPONSE = "💡 Lampe allumée !"
+_OFF_RESPONSE = "💡 Lampe éteinte !"
+_COLOR_RESPONSE = "🌈 Couleur changée"
+
+# Session Tapo partagée entre les appels, ouverte à la première commande
+_client = None
+_device = None
+_lock = asyncio.Lock()
+
+
+async def _get_device():
+    """Retourne la lampe connectée, en ne se connectant qu'une seule fois."""
+    global _client, _device
+    async with _lock:
+        if _device is None:
+            _client = ApiClient(TAPO_USERNAME, TAPO_PASSWORD)
+            _device = await _client.l530(TAPO_IP_ADDRESS)
+        return _device
+
+
+def close_lampe():
+    """Oublie la session Tapo et l'état connu, la prochaine commande se reconnecte."""
+    global _client, _device
+    _client = None
+    _device = None
+    _forget_state()
+
+
+atexit.register(close_lampe)
+
+
+# Les commandes reçues dans cette fenêtre (en secondes) sont regroupées :
+# seuls les derniers états d'alimentation, de luminosité et de couleur partent
+COALESCE_DELAY = 0.05
+
+_pending = {}
+_waiters = []
+_flush_task = None
+
+# Dernier état envoyé à la lampe, pour ne pas répéter une commande sans effet.
+# Il n'est fiable que STATE_TTL secondes : la lampe se pilote aussi depuis l'application Tapo
+STATE_TTL = 30
+_STATE = {"power": None, "brightness": None, "color": None}
+_state_time = 0.0
+
+
+def _known_state(field):
+    if time.monotonic() - _state_time > STATE_TTL:
+        return None
+    return _STATE[field]
+
+
+def _remember_state(state):
+    global _state_time
+    _STATE.update(state)
+    # Régler luminosité ou couleur peut rallumer la lampe
+    if "power" not in state:
+        _STATE["power"] = None
+    _state_time = time.monotonic()
+
+
+def _forget_state():
+    _STATE.update(dict.fromkeys(_STATE))
+
+
 # Contrôle de la lampe
 async def control_lampe(action, value=None):
-    tapo_username = TAPO_USERNAME
-    tapo_password = TAPO_PASSWORD
-    ip_address = TAPO_IP_ADDRESS
+    global _flush_task
+
+    command = _parse_action(action, value)
+    if command is None:
+        return "Commande invalide."
+    field, setting, response = command
+    if field is None:
+        return response
+
+    # La lampe est déjà dans cet état : rien à envoyer
+    if field not in _pending and _known_state(field) == setting:
+        if field == "power":
+            return "💡 Lampe déjà allumée" if setting else "💡 Lampe déjà éteinte"
+        return response
+
+    _pending[field] = setting
+    waiter = asyncio.get_running_loop().create_future()
+    _waiters.append(waiter)
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush())
+
+    error = await waiter
+    if error is not None:
+        return f"⚠️ Erreur avec Tapo : {error}"
+    return response
+
 
-    client = ApiClient(tapo_username, tapo_password)
-    device = await client.l530(ip_address)
+def _parse_action(action, value):
+    """Traduit une action en (champ, réglage, réponse), None si elle est inconnue.
 
+    Une valeur invalide donne (None, None, message d'erreur), sans appel à la lampe.
+    """
+    if action == "on":
+        return "power", True, _ON_RESPONSE
+    elif action == "off":
+        return "power", False, _OFF_RESPONSE
+    elif action in _BRIGHTNESS_PRESETS:
+        return ("brightness",) + _BRIGHTNESS_PRESETS[action]
+    elif action == "brightness_porcentage":
+        try:
+            value = min(max(int(value), 1), 100)
+        except (TypeError, ValueError):
+            return None, None, "⚠️ Valeur de luminosité invalide."
+        return "brightness", value, f"🔆 Luminosité réglée à {value}%"
+    elif action in _COLORS:
+        return "color", _COLORS[action], _COLOR_RESPONSE
+    return None
+
+
+async def _flush():
+    """Envoie à la lampe l'état final des commandes en attente."""
+    global _flush_task
     try:
+        while _pending:
+            await asyncio.sleep(COALESCE_DELAY)
+            state = dict(_pending)
+            waiters = list(_waiters)
+            _pending.clear()
+            _waiters.clear()
+
+            try:
+                try:
+                    await _apply(await _get_device(), state)
+                except Exception as e:
+                    if not _is_tapo_error(e):
+                        raise
+                    # Session expirée ou lampe redémarrée : nouvelle connexion et un seul essai
+                    close_lampe()
+                    await _apply(await _get_device(), state)
+                _remember_state(state)
+                error = None
+            except Exception as e:
+                _forget_state()
+                error = e
+
+            # Les erreurs Tapo deviennent un message, les autres remontent aux appelants
+            for waiter in waiters:
+                if waiter.done():
+                    continue
+                if error is None or _is_tapo_error(error):
+                    waiter.set_result(error)
+                else:
+                    waiter.set_exception(error)
+    finally:
+        _flush_task = None
+
+
+def _is_tapo_error(error):
+    """Vrai pour une erreur de la lampe ou du réseau.
+
+    tapo n'a pas de classe d'exception propre et lève des Exception nues
+    (HTTP, session, appareil) : une sous-classe vient donc d'un bug Python.
+    """
+    return type(error) is Exception or isinstance(error, (OSError, asyncio.TimeoutError))
+
 
-        if action == "on":
-            await device.on()
-            return "💡 Lampe allumée !"
-
-        elif action == "off":
-            await device.off()
-            return "💡 Lampe éteinte !"
-
-        elif action == "brightness_porcentage":
-            await device.set_brightness(value)
-            return f"🔆 Luminosité réglée à {value}%"
-        elif action == "brightness_min":
-            value = 30
-            await device.set_brightness(value)
-            return f"🔆 Luminosité réglée à {value}%"
-        elif action == "brightness_moyenne":
-            value = 50
-            await device.set_brightness(value)
-            return f"🔆 Luminosité réglée à {value}%"
-        elif action == "brightness_max":
-            value = 100
-            await device.set_brightness(value)
-            return f"🔆 Luminosité réglée à {value}%"
-
-        elif action == "color_indigo":
-            await device.set_color(Color.Indigo)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_blue":
-            await device.set_color(Color.Azure)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_rouge":
-            await device.set_color(Color.DarkRed)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_violet":
-            await device.set_color(Color.BlueViolet)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_vert":
-            await device.set_color(Color.ForestGreen)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_rose":
-            await device.set_color(Color.Pink)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_white":
-            await device.set_color(Color.CoolWhite)  
-            return f"🌈 Couleur changée ({value})"
-        elif action == "color_warm":
-            await device.set_color(Color.WarmWhite)  
-            return f"🌈 Couleur changée ({value})"
-        
-        else:
-            return "Commande invalide."
-        
-    except Exception as e:
-        return f"⚠️ Erreur avec Tapo : {e}"
\ No newline at end of file
+async def _apply(device, state):
+    if state.get("power") is True:
+        await device.on()
+    if "brightness" in state:
+        await device.set_brightness(state["brightness"])
+    if "color" in state:
+        await device.set_color(state["color"])
+    # Extinction en dernier, pour l'emporter sur les réglages de la même fenêtre
+    if state.get("power") is False:
+        await device.off()
@@ -0,0 +1,407 @@
+"""Speech helpers shared by the CLI and GUI voice pipelines."""
+import atexit
+import queue
+import re
+import threading
+from typing import Callable, Iterable, Iterator
+
+# Sentence terminator(s), optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r"[.!?…]+[\"')\]»]*\s+")
+
+# Abbreviations whose trailing period does not end a sentence
+ABBREVIATION_END = re.compile(r"(?:^|\s)(?:Dr|Mr|Mrs|Ms|M|Mme|Mlle|St)\.$")
+
+MIN_SENTENCE_LENGTH = 10
+
+# Raw PCM produced by ElevenLabs with output_format="pcm_22050"
+PCM_SAMPLE_RATE = 22050
+
+# Microphone capture and Silero VAD endpointing
+SAMPLE_RATE = 16000
+VAD_CHUNK = 512             # Silero VAD window at 16 kHz (32 ms)
+VAD_THRESHOLD = 0.5         # Speech probability above which a window is speech
+ENDPOINT_SILENCE_MS = 700   # Trailing silence that ends an utterance
+
+# Whisper decodes 30 s windows, longer audio is VAD-split and batched
+WHISPER_WINDOW_SECONDS = 30
+WHISPER_BATCH_SIZE = 8
+
+
+def sentence_buffer(tokens: Iterable[str], min_length: int = MIN_SENTENCE_LENGTH) -> Iterator[str]:
+    """Group streamed tokens into complete sentences.
+
+    A sentence ends on '.', '!' or '?' followed by whitespace, so decimal
+    numbers such as "3.5" never split. Abbreviations like "Dr." and
+    fragments shorter than min_length are merged into the next sentence.
+
+    Args:
+        tokens: Iterable of text fragments, e.g. LLM stream deltas
+        min_length: Minimum length of a yielded sentence
+
+    Yields:
+        Complete sentences, then whatever remains when the stream ends
+    """
+    buffer = ""
+    search_from = 0
+
+    for token in tokens:
+        buffer += token
+
+        while True:
+            match = SENTENCE_END.search(buffer, search_from)
+            if match is None:
+                break
+
+            sentence = buffer[:match.end()].strip()
+            if len(sentence) < min_length or ABBREVIATION_END.search(sentence):
+                search_from = match.end()
+                continue
+
+            yield sentence
+            buffer = buffer[match.end():]
+            search_from = 0
+
+    # Flush the tail of the stream
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class PcmPlayer:
+    """Output stream that stays open between sentences.
+
+    Opening the audio device on every sentence adds latency and an audible
+    gap, so the PyAudio instance and the output stream are opened on first
+    use and reused until close().
+    """
+
+    def __init__(self, sample_rate: int = PCM_SAMPLE_RATE):
+        """Create the player, the device is opened by the first play() call.
+
+        Args:
+            sample_rate: Sample rate of the audio
+        """
+        self.sample_rate = sample_rate
+        self._pyaudio = None
+        self._stream = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def play(self, chunks: Iterable[bytes]) -> None:
+        """Play 16-bit mono PCM chunks as they arrive.
+
+        Args:
+            chunks: Iterable of raw little-endian int16 audio bytes
+        """
+        with self._lock:
+            if self._stream is None:
+                import pyaudio
+
+                self._pyaudio = pyaudio.PyAudio()
+                self._stream = self._pyaudio.open(
+                    format=pyaudio.paInt16,
+                    channels=1,
+                    rate=self.sample_rate,
+                    output=True
+                )
+
+            # Network chunks can split a sample in half, carry the odd byte over
+            leftover = b""
+            for chunk in chunks:
+                data = leftover + chunk
+                even = len(data) - len(data) % 2
+                if even:
+                    self._stream.write(data[:even])
+                leftover = data[even:]
+
+    def close(self) -> None:
+        """Close the output stream and release PyAudio."""
+        with self._lock:
+            if self._stream is not None:
+                self._stream.stop_stream()
+                self._stream.close()
+                self._pyaudio.terminate()
+                self._stream = None
+
+
+class Endpointer:
+    """Voice activity state machine deciding when an utterance is over.
+
+    IDLE until speech is heard, then LISTENING until ENDPOINT_SILENCE_MS of
+    continuous silence, then DONE.
+    """
+
+    IDLE = "idle"
+    LISTENING = "listening"
+    DONE = "done"
+
+    def __init__(self, silence_ms: float = ENDPOINT_SILENCE_MS):
+        """Initialize the state machine.
+
+        Args:
+            silence_ms: Trailing silence duration that ends an utterance
+        """
+        self.state = self.IDLE
+        self.silence_ms = silence_ms
+        self._silent_for = 0.0
+
+    def update(self, is_speech: bool, chunk_ms: float) -> bool:
+        """Advance the state machine by one audio chunk.
+
+        Args:
+            is_speech: Whether the VAD flagged the chunk as speech
+            chunk_ms: Duration of the chunk in milliseconds
+
+        Returns:
+            True once the utterance is over
+        """
+        if self.state == self.IDLE:
+            if is_speech:
+                self.state = self.LISTENING
+        elif self.state == self.LISTENING:
+            if is_speech:
+                self._silent_for = 0.0
+            else:
+                self._silent_for += chunk_ms
+                if self._silent_for >= self.silence_ms:
+                    self.state = self.DONE
+
+        return self.state == self.DONE
+
+
+def to_mono_16k(sample_rate: int, data):
+    """Convert a browser audio chunk to what Whisper and the VAD expect.
+
+    Args:
+        sample_rate: Sample rate of the chunk, e.g. 48000 in most browsers
+        data: numpy array of samples, shape (n,) or (n, channels)
+
+    Returns:
+        Mono float32 numpy array at SAMPLE_RATE normalized to [-1, 1]
+    """
+    import numpy as np
+
+    audio = np.asarray(data)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio.astype(np.float32) / (np.iinfo(audio.dtype).max + 1)
+    else:
+        audio = audio.astype(np.float32)
+
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    if sample_rate != SAMPLE_RATE and len(audio):
+        length = int(round(len(audio) * SAMPLE_RATE / sample_rate))
+        positions = np.linspace(0, len(audio) - 1, length)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+    return audio
+
+
+class Utterance:
+    """Accumulate streamed audio chunks until the speaker stops talking.
+
+    Chunks can have any size, the VAD runs over VAD_CHUNK windows and the
+    remainder is kept for the next chunk.
+    """
+
+    def __init__(self, vad):
+        """Start a new utterance.
+
+        Args:
+            vad: Silero VAD model, as returned by silero_vad.load_silero_vad()
+        """
+        self.vad = vad
+        self.chunks = []
+        self.endpointer = Endpointer()
+        self._pending = None
+        vad.reset_states()
+
+    def feed(self, audio) -> bool:
+        """Append a chunk and run the VAD over it.
+
+        Args:
+            audio: Mono float32 numpy array at SAMPLE_RATE
+
+        Returns:
+            True once the utterance is over
+        """
+        import numpy as np
+        import torch
+
+        self.chunks.append(audio)
+        if self._pending is not None:
+            audio = np.concatenate((self._pending, audio))
+
+        chunk_ms = 1000 * VAD_CHUNK / SAMPLE_RATE
+        end = len(audio) - len(audio) % VAD_CHUNK
+        for start in range(0, end, VAD_CHUNK):
+            window = torch.from_numpy(audio[start:start + VAD_CHUNK])
+            if self.endpointer.update(self.vad(window, SAMPLE_RATE).item() >= VAD_THRESHOLD, chunk_ms):
+                break
+        self._pending = audio[end:]
+
+        # Nothing said yet, only keep the latest chunk as pre-roll
+        if self.endpointer.state == Endpointer.IDLE:
+            self.chunks = self.chunks[-1:]
+
+        return self.endpointer.state == Endpointer.DONE
+
+    def audio(self):
+        """Return everything recorded so far as one float32 numpy array."""
+        import numpy as np
+
+        if not self.chunks:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(self.chunks)
+
+
+class Microphone:
+    """Long-lived microphone input stream with VAD endpointing.
+
+    The PyAudio instance and the callback-mode input stream are opened once
+    and only started/stopped per utterance, which avoids reopening the audio
+    device on every turn.
+    """
+
+    def __init__(self, vad, sample_rate: int = SAMPLE_RATE):
+        """Open the input stream (stopped until record() is called).
+
+        Args:
+            vad: Silero VAD model, as returned by silero_vad.load_silero_vad()
+            sample_rate: Sample rate, 16 kHz as expected by Whisper and the VAD
+        """
+        import pyaudio
+
+        self.vad = vad
+        self.sample_rate = sample_rate
+        self._continue = pyaudio.paContinue
+        self._buffer = None
+        self._filled = 0
+        self._endpointer = None
+        self._done = threading.Event()
+
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=sample_rate,
+            input=True,
+            frames_per_buffer=VAD_CHUNK,
+            stream_callback=self._callback,
+            start=False
+        )
+        atexit.register(self.close)
+
+    def record(self, max_duration: float = 10):
+        """Record until the speaker stops talking.
+
+        Each chunk goes through Silero VAD and recording stops after
+        ENDPOINT_SILENCE_MS of silence following speech, or after
+        max_duration seconds.
+
+        Args:
+            max_duration: Maximum recording duration in seconds
+
+        Returns:
+            Recorded audio as a float32 numpy array normalized to [-1, 1]
+        """
+        import numpy as np
+
+        self._buffer = np.empty(int(max_duration * self.sample_rate), dtype=np.int16)
+        self._filled = 0
+        self._endpointer = Endpointer()
+        self._done.clear()
+        self.vad.reset_states()
+
+        try:
+            self._stream.start_stream()
+            self._done.wait(max_duration + 1)
+        finally:
+            self._stream.stop_stream()
+
+        # Convert to float32 and normalize in place
+        audio_data = self._buffer[:self._filled].astype(np.float32)
+        audio_data *= 1.0 / 32768.0
+        return audio_data
+
+    def close(self) -> None:
+        """Close the input stream and release PyAudio."""
+        if self._stream is not None:
+            self._stream.close()
+            self._pyaudio.terminate()
+            self._stream = None
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        import numpy as np
+        import torch
+
+        if self._done.is_set():
+            return None, self._continue
+
+        chunk = np.frombuffer(in_data, dtype=np.int16)
+        count = min(len(chunk), len(self._buffer) - self._filled)
+        self._buffer[self._filled:self._filled + count] = chunk[:count]
+        self._filled += count
+
+        chunk_ms = 1000 * VAD_CHUNK / self.sample_rate
+        for start in range(0, len(chunk) - VAD_CHUNK + 1, VAD_CHUNK):
+            window = torch.from_numpy(chunk[start:start + VAD_CHUNK].astype(np.float32) / 32768.0)
+            if self._endpointer.update(self.vad(window, self.sample_rate).item() >= VAD_THRESHOLD, chunk_ms):
+                break
+
+        if self._endpointer.state == Endpointer.DONE or self._filled == len(self._buffer):
+            self._done.set()
+        return None, self._continue
+
+
+class SentenceSpeaker:
+    """Speak a reply sentence by sentence while it is still being generated.
+
+    Synthesis and playback run on separate threads: the audio of the next
+    sentence is fetched while the current one plays, so the TTS latency is
+    only paid once per reply instead of once per sentence.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Iterable[bytes]],
+        play: Callable[[Iterable[bytes]], None]
+    ):
+        """Start the synthesis and playback threads.
+
+        Args:
+            synthesize: Function returning the PCM chunks of one sentence
+            play: Blocking function playing a stream of PCM chunks
+        """
+        self._tokens = queue.Queue()
+        self._audio = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._synthesize, args=(synthesize,), daemon=True),
+            threading.Thread(target=self._play, args=(play,), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def feed(self, token: str) -> None:
+        """Queue a streamed text fragment."""
+        self._tokens.put(token)
+
+    def close(self) -> None:
+        """Mark the end of the reply so the last sentence gets flushed."""
+        self._tokens.put(None)
+
+    def join(self) -> None:
+        """Wait until every queued sentence has been spoken."""
+        for thread in self._threads:
+            thread.join()
+
+    def _synthesize(self, synthesize: Callable[[str], Iterable[bytes]]) -> None:
+        try:
+            for sentence in sentence_buffer(iter(self._tokens.get, None)):
+                for chunk in synthesize(sentence):
+                    self._audio.put(chunk)
+        finally:
+            self._audio.put(None)
+
+    def _play(self, play: Callable[[Iterable[bytes]], None]) -> None:
+        play(iter(self._audio.get, None))
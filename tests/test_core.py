@@ -92,6 +92,17 @@ def test_tool_schemas():
     assert set(browser_schema["function"]["parameters"]["required"]) == {"task_description", "expected_result"}
 
 
+def test_tool_schema_generated_from_signature():
+    """Test that the tool decorator maps Literal to an enum and defaults to optional."""
+    from tools import TOOL_SCHEMAS_BY_NAME
+
+    parameters = TOOL_SCHEMAS_BY_NAME["control_light"]["function"]["parameters"]
+    assert parameters["properties"]["action"]["type"] == "string"
+    assert "color_warm" in parameters["properties"]["action"]["enum"]
+    assert parameters["properties"]["value"]["type"] == "integer"
+    assert parameters["required"] == ["action"]
+
+
 def test_execute_tool_get_date():
     """Test execute_tool with get_date."""
     from tools import execute_tool
@@ -111,6 +122,89 @@ def test_execute_tool_unknown():
     assert "Unknown tool" in result
 
 
+def test_execute_tool_missing_arguments():
+    """Test that execute_tool rejects calls missing required arguments."""
+    from tools import TOOL_REQUIRED, TOOL_SCHEMAS_BY_NAME, execute_tool
+
+    assert TOOL_SCHEMAS_BY_NAME["send_mail_gmail"]["function"]["name"] == "send_mail_gmail"
+    assert TOOL_REQUIRED["add_google_contacts"] == {"name", "email"}
+
+    result = execute_tool("add_google_contacts", {"name": "Alice"})
+    assert "Error" in result
+    assert "email" in result
+
+    assert execute_tool("add_google_contacts", None).startswith("Error")
+    assert execute_tool("add_google_contacts", ["Alice"]).startswith("Error")
+
+
+def test_execute_tool_reuses_event_loop():
+    """Test that async tools all run on the same long-lived event loop."""
+    import asyncio
+    import tools
+    from unittest.mock import patch
+
+    async def loop_id():
+        return id(asyncio.get_running_loop())
+
+    with patch.dict(tools._DISPATCH, {"loop_id": (True, loop_id)}):
+        first = tools.execute_tool("loop_id", {})
+        second = tools.execute_tool("loop_id", {})
+
+    assert first == second == str(id(tools._LOOP))
+
+
+def test_execute_tools_runs_calls_concurrently():
+    """Test that execute_tools runs independent calls at the same time, in order."""
+    import threading
+    import tools
+    from unittest.mock import patch
+
+    # Each call only returns once both are running
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait(label):
+        barrier.wait()
+        return label
+
+    with patch.dict(tools._DISPATCH, {"wait_a": (False, wait), "wait_b": (False, wait)}):
+        results = tools.execute_tools([("wait_a", {"label": "a"}), ("wait_b", {"label": "b"})])
+
+    assert results == ["a", "b"]
+
+
+def test_execute_tools_keeps_order_per_tool():
+    """Test that calls to the same tool run one after another in order."""
+    import time
+    import tools
+    from unittest.mock import patch
+
+    calls = []
+
+    def lamp(action):
+        if action == "on":
+            time.sleep(0.1)
+        calls.append(action)
+        return action
+
+    with patch.dict(tools._DISPATCH, {"lamp": (False, lamp)}):
+        results = tools.execute_tools([("lamp", {"action": "on"}), ("lamp", {"action": "off"})])
+
+    assert results == ["on", "off"]
+    assert calls == ["on", "off"]
+
+
+def test_lazy_tools_keep_calling_convention():
+    """Test that lazy tool proxies resolve on call and stay sync or async."""
+    import asyncio
+    import tools
+
+    dumps = tools._lazy("json", "dumps")
+    assert dumps([1]) == "[1]"
+    assert tools._DISPATCH["control_light"][0] is True
+    assert tools._DISPATCH["access_gmail"][0] is False
+    assert asyncio.iscoroutinefunction(tools.TOOL_FUNCTIONS["control_light"])
+
+
 def test_tool_registry():
     """Test that tool registry contains all tools."""
     from tools import TOOL_FUNCTIONS
@@ -150,6 +244,15 @@ def test_clean_email_body():
     whitespace_text = "   Test content   "
     assert clean_email_body(whitespace_text) == "Test content"
 
+    # Test that plain text keeps angle brackets
+    plain_text = "Alice <alice@example.com>\r\n\r\n\r\nSalut"
+    assert clean_email_body(plain_text, is_html=False) == "Alice <alice@example.com>\n\nSalut"
+
+    # Test tags that join line breaks once removed
+    assert clean_email_body("Hello\r<br>\nWorld") == "Hello\nWorld"
+    assert clean_email_body("a\n<b>\n<i>\nb") == "a\n\nb"
+    assert clean_email_body("a\r<br>\n\r<br>\n\r<br>\nb") == "a\n\nb"
+
 
 def test_extract_email_body_no_parts():
     """Test email body extraction for messages without parts."""
@@ -229,6 +332,200 @@ def test_get_message_details_error_handling():
     assert "Error retrieving email" in result["subject"]
 
 
+def test_parse_message_headers():
+    """Test that parse_message extracts headers and body from a message."""
+    from services.google.gmail.access_mail_gmail import parse_message
+    import base64
+
+    msg = {
+        "id": "abc",
+        "payload": {
+            "headers": [
+                {"name": "From", "value": "alice@example.com"},
+                {"name": "Subject", "value": "Bonjour"},
+            ],
+            "body": {"data": base64.urlsafe_b64encode(b"Salut").decode("ASCII")}
+        }
+    }
+
+    result = parse_message(msg)
+
+    assert result["id"] == "abc"
+    assert result["sender"] == "alice@example.com"
+    assert result["subject"] == "Bonjour"
+    assert result["date"] == "Unknown"
+    assert result["body"] == "Salut"
+
+
+def test_iter_message_details_batches_in_order():
+    """Test that iter_message_details packs requests into batches and keeps message order."""
+    from services.google.gmail import access_mail_gmail
+    from unittest.mock import Mock
+
+    batches = []
+
+    def new_batch_http_request(callback):
+        added = []
+        batch = Mock()
+        batch.add.side_effect = lambda request, request_id: added.append(request_id)
+
+        def execute():
+            # Answer out of order, failing the first request of each batch
+            for request_id in reversed(added):
+                if request_id == added[0]:
+                    callback(request_id, None, Exception("API Error"))
+                else:
+                    msg = {"id": f"id{request_id}", "payload": {"headers": [], "body": {}}}
+                    callback(request_id, msg, None)
+
+        batch.execute.side_effect = execute
+        batches.append(added)
+        return batch
+
+    service = Mock()
+    service.new_batch_http_request.side_effect = new_batch_http_request
+    ids = [f"id{i}" for i in range(75)]
+
+    result = list(access_mail_gmail.iter_message_details(service, ids))
+
+    assert [len(added) for added in batches] == [50, 25]
+    assert [email["id"] for email in result] == ids
+    assert "error" in result[0] and "error" in result[50]
+    assert "error" not in result[1]
+
+
+def test_iter_message_details_failed_batch_keeps_others():
+    """Test that a batch request failing as a whole only marks its own messages as errors."""
+    from services.google.gmail import access_mail_gmail
+    from unittest.mock import Mock
+
+    def new_batch_http_request(callback):
+        added = []
+        batch = Mock()
+        batch.add.side_effect = lambda request, request_id: added.append(request_id)
+
+        def execute():
+            if added[0] == "0":
+                raise ConnectionError("Connection reset")
+            for request_id in added:
+                callback(request_id, {"id": f"id{request_id}", "payload": {"headers": [], "body": {}}}, None)
+
+        batch.execute.side_effect = execute
+        return batch
+
+    service = Mock()
+    service.new_batch_http_request.side_effect = new_batch_http_request
+    ids = [f"id{i}" for i in range(60)]
+
+    result = list(access_mail_gmail.iter_message_details(service, ids))
+
+    assert [email["id"] for email in result] == ids
+    assert all("Connection reset" in email["error"] for email in result[:50])
+    assert all("error" not in email for email in result[50:])
+
+
+def test_iter_message_details_retries_rate_limited():
+    """Test that rate-limited sub-requests are sent again in a later batch."""
+    from services.google.gmail import access_mail_gmail
+    from googleapiclient.errors import HttpError
+    from unittest.mock import Mock, patch
+
+    batches = []
+
+    def new_batch_http_request(callback):
+        added = []
+        batch = Mock()
+        batch.add.side_effect = lambda request, request_id: added.append(request_id)
+
+        def execute():
+            # Throttle the odd requests of the first batch only
+            for request_id in added:
+                if len(batches) == 1 and int(request_id) % 2:
+                    callback(request_id, None, HttpError(Mock(status=429, reason="Too Many Requests"), b""))
+                else:
+                    callback(request_id, {"id": f"id{request_id}", "payload": {"headers": [], "body": {}}}, None)
+
+        batch.execute.side_effect = execute
+        batches.append(added)
+        return batch
+
+    service = Mock()
+    service.new_batch_http_request.side_effect = new_batch_http_request
+    ids = [f"id{i}" for i in range(10)]
+
+    with patch.object(access_mail_gmail.time, "sleep") as sleep:
+        result = list(access_mail_gmail.iter_message_details(service, ids))
+
+    assert batches[1] == ["1", "3", "5", "7", "9"]
+    assert sleep.call_count == 1
+    assert [email["id"] for email in result] == ids
+    assert all("error" not in email for email in result)
+
+
+def test_iter_message_details_parses_in_process_pool():
+    """Test that large fetches parse in worker processes and keep message order."""
+    from services.google.gmail import access_mail_gmail
+    from unittest.mock import Mock, patch
+
+    def new_batch_http_request(callback):
+        added = []
+        batch = Mock()
+        batch.add.side_effect = lambda request, request_id: added.append(request_id)
+
+        def execute():
+            for request_id in added:
+                headers = [{"name": "Subject", "value": f"Subject {request_id}"}]
+                msg = {"id": f"id{request_id}", "payload": {"headers": headers, "body": {}}}
+                callback(request_id, msg, None)
+
+        batch.execute.side_effect = execute
+        return batch
+
+    service = Mock()
+    service.new_batch_http_request.side_effect = new_batch_http_request
+    ids = [f"id{i}" for i in range(120)]
+
+    with patch.object(access_mail_gmail, "PARALLEL_PARSE_MIN", 1), \
+         patch.object(access_mail_gmail.os, "cpu_count", return_value=2):
+        result = list(access_mail_gmail.iter_message_details(service, ids))
+
+    assert [email["id"] for email in result] == ids
+    assert result[119]["subject"] == "Subject 119"
+
+
+def test_iter_message_details_malformed_message():
+    """Test that a message that fails to parse becomes an error entry, in and out of process."""
+    from services.google.gmail import access_mail_gmail
+    from unittest.mock import Mock, patch
+
+    def new_batch_http_request(callback):
+        added = []
+        batch = Mock()
+        batch.add.side_effect = lambda request, request_id: added.append(request_id)
+
+        def execute():
+            for request_id in added:
+                # Message 1 has no payload headers
+                payload = {"body": {}} if request_id == "1" else {"headers": [], "body": {}}
+                callback(request_id, {"id": f"id{request_id}", "payload": payload}, None)
+
+        batch.execute.side_effect = execute
+        return batch
+
+    service = Mock()
+    service.new_batch_http_request.side_effect = new_batch_http_request
+    ids = ["id0", "id1", "id2"]
+
+    for parallel_min in (len(ids) + 1, 1):
+        with patch.object(access_mail_gmail, "PARALLEL_PARSE_MIN", parallel_min), \
+             patch.object(access_mail_gmail.os, "cpu_count", return_value=2):
+            result = list(access_mail_gmail.iter_message_details(service, ids))
+
+        assert [email["id"] for email in result] == ids
+        assert "headers" in result[1]["error"]
+        assert "error" not in result[0] and "error" not in result[2]
+
+
 def test_authenticate_gmail_scopes():
     """Test that Gmail API scopes are correctly defined."""
     from services.google.gmail.access_mail_gmail import SCOPES
@@ -247,6 +544,36 @@ def test_days_window_constant():
 
 
 # Test write_mail_gmail.py
+def test_build_raw_message():
+    """Test that the raw RFC 822 message has encoded headers and a UTF-8 body."""
+    from services.google.gmail.write_mail_gmail import build_raw_message
+    from email import message_from_bytes
+    from email.header import decode_header, make_header
+    import base64
+
+    raw = build_raw_message("me@example.com", "Zoé <zoe@example.com>", "Réunion", "Bonjour Zoé")
+    message = message_from_bytes(base64.urlsafe_b64decode(raw))
+
+    assert "\r\n" in base64.urlsafe_b64decode(raw).decode("utf-8")
+    assert message["To"].startswith("=?utf-8?")
+    assert str(make_header(decode_header(message["To"]))) == "Zoé <zoe@example.com>"
+    assert str(make_header(decode_header(message["Subject"]))) == "Réunion"
+    assert message.get_payload(decode=True).decode("utf-8") == "Bonjour Zoé"
+
+
+def test_build_raw_message_folds_with_crlf_and_rejects_newlines():
+    """Test that long encoded subjects fold with CRLF and header injection is refused."""
+    from services.google.gmail.write_mail_gmail import build_raw_message
+    import base64
+
+    raw = build_raw_message("me@example.com", "zoe@example.com", "Réunion " * 20, "Bonjour")
+    headers = base64.urlsafe_b64decode(raw).decode("utf-8").split("\r\n\r\n")[0]
+    assert "\n" not in headers.replace("\r\n", "")
+
+    with pytest.raises(ValueError):
+        build_raw_message("me@example.com", "zoe@example.com", "Hi\r\nBcc: evil@example.com", "Bonjour")
+
+
 def test_extract_email_details_valid():
     """Test email details extraction from valid draft."""
     from services.google.gmail.write_mail_gmail import extract_email_details
@@ -334,6 +661,26 @@ def test_add_google_contacts_scopes():
     assert "https://www.googleapis.com/auth/contacts" in SCOPES
 
 
+def test_create_google_contacts_batch_chunks():
+    """Test that contacts are created in batches of at most 200."""
+    from services.google.contacts import add_google_contacts as contacts_module
+    from unittest.mock import MagicMock, patch
+
+    service = MagicMock()
+    batch_create = service.people.return_value.batchCreateContacts
+    batch_create.return_value.execute.return_value = {
+        "createdPeople": [{"person": {"resourceName": "people/1"}}]
+    }
+    contacts = [{"name": f"Contact {i}", "email": None, "phone": None} for i in range(450)]
+
+    with patch.object(contacts_module, "authenticate_google_contacts", return_value=service):
+        created = contacts_module.create_google_contacts_batch(contacts)
+
+    sizes = [len(call.kwargs["body"]["contacts"]) for call in batch_create.call_args_list]
+    assert sizes == [200, 200, 50]
+    assert created == ["people/1"] * 3
+
+
 # Test get_google_contacts.py
 def test_get_google_contacts_scopes():
     """Test that Google Contacts get scopes are correctly defined."""
@@ -343,6 +690,25 @@ def test_get_google_contacts_scopes():
     assert "https://www.googleapis.com/auth/contacts.readonly" in SCOPES
 
 
+def test_get_google_contacts_follows_pages():
+    """Test that contacts are read from every page of results."""
+    from services.google.contacts import get_google_contacts as contacts_module
+    from unittest.mock import MagicMock, patch
+
+    service = MagicMock()
+    service.people().connections().list().execute.side_effect = [
+        {"connections": [{"names": [{"displayName": "Alice"}]}], "nextPageToken": "page2"},
+        {"connections": [{"names": [{"displayName": "Bob"}], "emailAddresses": [{"value": "bob@example.com"}]}]},
+    ]
+
+    with patch.object(contacts_module, "authenticate_google", return_value=service):
+        contacts = contacts_module.get_google_contacts()
+
+    assert [c["name"] for c in contacts] == ["Alice", "Bob"]
+    assert contacts[0]["email"] == "Non fourni"
+    assert contacts[1]["email"] == "bob@example.com"
+
+
 # Test browser_agent.py
 def test_execute_browser_task_returns_dict():
     """Test that execute_browser_task returns expected structure."""
@@ -378,3 +744,299 @@ def test_execute_browser_task_handles_errors():
 
         assert result["status"] == "error"
         assert "Browser error" in result["output"]
+
+
+# Test control_light.py
+def test_control_lampe_reuses_session():
+    """Test that control_lampe logs in once and reconnects after a failure."""
+    import asyncio
+    from services.light import control_light
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    device = MagicMock()
+    device.on = AsyncMock()
+    device.set_brightness = AsyncMock()
+    device.off = AsyncMock(side_effect=[Exception("Session expired"), None])
+    client = MagicMock()
+    client.l530 = AsyncMock(return_value=device)
+
+    control_light.close_lampe()
+    with patch.object(control_light, "ApiClient", return_value=client) as api_client:
+        assert asyncio.run(control_light.control_lampe("on")) == "💡 Lampe allumée !"
+        assert asyncio.run(control_light.control_lampe("brightness_max")) == "🔆 Luminosité réglée à 100%"
+        assert api_client.call_count == 1
+
+        assert asyncio.run(control_light.control_lampe("off")) == "💡 Lampe éteinte !"
+        assert api_client.call_count == 2
+    control_light.close_lampe()
+
+
+def test_control_lampe_coalesces_commands():
+    """Test that commands sent together reach the lamp as one final state."""
+    import asyncio
+    from services.light import control_light
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    device = MagicMock()
+    device.set_brightness = AsyncMock()
+    device.set_color = AsyncMock()
+    client = MagicMock()
+    client.l530 = AsyncMock(return_value=device)
+
+    async def burst():
+        return await asyncio.gather(
+            control_light.control_lampe("brightness_min"),
+            control_light.control_lampe("brightness_porcentage", 80),
+            control_light.control_lampe("color_warm"),
+        )
+
+    control_light.close_lampe()
+    with patch.object(control_light, "ApiClient", return_value=client):
+        results = asyncio.run(burst())
+    control_light.close_lampe()
+
+    assert results == ["🔆 Luminosité réglée à 30%", "🔆 Luminosité réglée à 80%", "🌈 Couleur changée"]
+    device.set_brightness.assert_awaited_once_with(80)
+    device.set_color.assert_awaited_once()
+
+
+def test_control_lampe_skips_unchanged_state():
+    """Test that a command matching the last known state is not sent again."""
+    import asyncio
+    from services.light import control_light
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    device = MagicMock()
+    device.on = AsyncMock()
+    device.set_color = AsyncMock()
+    client = MagicMock()
+    client.l530 = AsyncMock(return_value=device)
+
+    control_light.close_lampe()
+    with patch.object(control_light, "ApiClient", return_value=client):
+        asyncio.run(control_light.control_lampe("on"))
+        assert asyncio.run(control_light.control_lampe("on")) == "💡 Lampe déjà allumée"
+        asyncio.run(control_light.control_lampe("color_warm"))
+        asyncio.run(control_light.control_lampe("color_warm"))
+    control_light.close_lampe()
+
+    device.on.assert_awaited_once()
+    device.set_color.assert_awaited_once()
+
+
+def test_control_lampe_raises_programming_errors():
+    """Test that only Tapo errors become messages, other exceptions propagate."""
+    import asyncio
+    from services.light import control_light
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    device = MagicMock()
+    device.on = AsyncMock(side_effect=[Exception("Device unreachable"), Exception("Device unreachable")])
+    device.off = AsyncMock(side_effect=TypeError("bad argument"))
+    client = MagicMock()
+    client.l530 = AsyncMock(return_value=device)
+
+    control_light.close_lampe()
+    with patch.object(control_light, "ApiClient", return_value=client):
+        assert asyncio.run(control_light.control_lampe("on")) == "⚠️ Erreur avec Tapo : Device unreachable"
+        with pytest.raises(TypeError):
+            asyncio.run(control_light.control_lampe("off"))
+    control_light.close_lampe()
+
+    device.off.assert_awaited_once()
+
+
+def test_control_lampe_validates_brightness():
+    """Test that brightness values are clamped or rejected before reaching the lamp."""
+    from services.light.control_light import _parse_action
+
+    assert _parse_action("brightness_porcentage", 150) == ("brightness", 100, "🔆 Luminosité réglée à 100%")
+    assert _parse_action("brightness_porcentage", "40")[1] == 40
+    assert _parse_action("brightness_porcentage", "high")[0] is None
+    assert _parse_action("brightness_porcentage", None)[0] is None
+
+
+# Test _http.py
+def test_shared_client_is_reused():
+    """Test that get_shared_client returns one client until it is closed."""
+    from services import _http
+
+    client = _http.get_shared_client()
+    assert _http.get_shared_client() is client
+
+    _http.close()
+    assert client.is_closed
+    assert _http.get_shared_client() is not client
+    _http.close()
+
+
+# Test speech.py
+def test_sentence_buffer_splits_streamed_tokens():
+    """Test that streamed tokens are regrouped into sentences."""
+    from speech import sentence_buffer
+
+    tokens = ["Bonjour, je suis", " Gladys. Comment", " puis-je vous aider ?", " Très bien"]
+    sentences = list(sentence_buffer(tokens))
+
+    assert sentences == ["Bonjour, je suis Gladys.", "Comment puis-je vous aider ?", "Très bien"]
+
+
+def test_sentence_buffer_keeps_abbreviations_and_decimals():
+    """Test that abbreviations, decimals and short fragments do not split."""
+    from speech import sentence_buffer
+
+    text = "Ok. Dr. Martin mesure 1.85 mètre. C'est grand !"
+    sentences = list(sentence_buffer(list(text)))
+
+    assert sentences == ["Ok. Dr. Martin mesure 1.85 mètre.", "C'est grand !"]
+
+
+def test_pcm_player_keeps_stream_open():
+    """Test that PcmPlayer opens the device once and carries odd bytes over."""
+    import sys
+    from speech import PcmPlayer
+    from unittest.mock import MagicMock, patch
+
+    pyaudio = MagicMock()
+    stream = pyaudio.PyAudio.return_value.open.return_value
+
+    with patch.dict(sys.modules, {"pyaudio": pyaudio}):
+        player = PcmPlayer()
+        player.play([b"\x01\x02\x03", b"\x04"])
+        player.play([b"\x05\x06"])
+        player.close()
+
+    pyaudio.PyAudio.return_value.open.assert_called_once()
+    assert [c.args[0] for c in stream.write.call_args_list] == [b"\x01\x02", b"\x03\x04", b"\x05\x06"]
+    stream.close.assert_called_once()
+
+
+def test_sentence_speaker_synthesizes_ahead_of_playback():
+    """Test that the next sentence is synthesized while the current one plays."""
+    import threading
+    from speech import SentenceSpeaker
+
+    second_synthesized = threading.Event()
+    played = []
+
+    def synthesize(sentence):
+        if sentence.startswith("Second"):
+            second_synthesized.set()
+        yield sentence.encode()
+
+    def play(chunks):
+        for chunk in chunks:
+            # Playback of the first sentence waits for the second to be fetched
+            assert second_synthesized.wait(5)
+            played.append(chunk)
+
+    speaker = SentenceSpeaker(synthesize, play)
+    for token in ["First sentence here. ", "Second sentence here."]:
+        speaker.feed(token)
+    speaker.close()
+    speaker.join()
+
+    assert played == [b"First sentence here.", b"Second sentence here."]
+
+
+# Test agent.py
+def test_agent_chat_stream_accumulates_deltas():
+    """Test that streamed content and tool call deltas are reassembled."""
+    from agent import Agent
+    from unittest.mock import MagicMock
+    from types import SimpleNamespace
+
+    def event(content=None, tool_calls=None):
+        delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+        return SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+
+    def tool_call(index, id, name, arguments):
+        return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+    events = [
+        event(content="Je regarde"),
+        event(content=" ça."),
+        event(tool_calls=[tool_call(0, "call_1", "get_date", '{"a"')]),
+        event(tool_calls=[tool_call(0, "null", "", ': 1}')]),
+    ]
+
+    agent = Agent.__new__(Agent)
+    agent.model = "test-model"
+    agent.client = MagicMock()
+    agent.client.chat.stream.return_value.__enter__.return_value = iter(events)
+
+    received = []
+    content, tool_calls = agent._chat([], on_text=received.append)
+
+    assert content == "Je regarde ça."
+    assert received == ["Je regarde", " ça."]
+    assert tool_calls == [{
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "get_date", "arguments": '{"a": 1}'}
+    }]
+
+
+def test_agent_streams_separator_around_tool_call():
+    """Test that text streamed before and after a tool call stays separate."""
+    import agent as agent_module
+    from agent import Agent
+    from unittest.mock import MagicMock, patch
+    from types import SimpleNamespace
+
+    def event(content=None, tool_calls=None):
+        delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+        return SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+
+    call = SimpleNamespace(index=0, id="call_1", function=SimpleNamespace(name="get_date", arguments="{}"))
+    first = [event(content="Je regarde."), event(tool_calls=[call])]
+    second = [event(content="Il fait beau.")]
+
+    agent = Agent.__new__(Agent)
+    agent.model = "test-model"
+    agent.system_message = {"role": "system", "content": "test"}
+    agent.client = MagicMock()
+    agent.client.chat.stream.return_value.__enter__.side_effect = [iter(first), iter(second)]
+
+    received = []
+    with patch.object(agent_module, "execute_tools", return_value=["lundi"]):
+        messages, response = agent.process_message([], "Quel temps ?", on_text=received.append)
+
+    assert "".join(received) == "Je regarde. Il fait beau."
+    assert response == "Il fait beau."
+    assert messages[-2] == {"role": "tool", "name": "get_date", "tool_call_id": "call_1", "content": "lundi"}
+
+
+def test_endpointer_waits_for_trailing_silence():
+    """Test that the endpointer ends an utterance only after speech then silence."""
+    from speech import Endpointer
+
+    endpointer = Endpointer(silence_ms=100)
+
+    # Leading silence never ends the utterance
+    assert not any(endpointer.update(False, 32) for _ in range(10))
+    assert endpointer.state == Endpointer.IDLE
+
+    assert not endpointer.update(True, 32)
+    assert endpointer.state == Endpointer.LISTENING
+
+    # A short pause is not enough
+    assert not endpointer.update(False, 32)
+    assert not endpointer.update(True, 32)
+
+    results = [endpointer.update(False, 32) for _ in range(4)]
+    assert results == [False, False, False, True]
+    assert endpointer.state == Endpointer.DONE
+
+
+def test_to_mono_16k_resamples_browser_audio():
+    """Test that browser chunks are downmixed, normalized and resampled to 16 kHz."""
+    import numpy as np
+    from speech import to_mono_16k
+
+    stereo = np.full((4800, 2), 16384, dtype=np.int16)
+    audio = to_mono_16k(48000, stereo)
+
+    assert audio.dtype == np.float32
+    assert audio.shape == (1600,)
+    assert np.allclose(audio, 0.5)
@@ -5,7 +5,8 @@ from pathlib import Path
 from memory import (
     load_memory, save_memory, get_memory_size_kb,
     should_summarize, create_summary_request,
-    compress_memory, add_message
+    compress_memory, add_message, trim_history,
+    MemoryWriter
 )
 
 
@@ -116,6 +117,77 @@ def test_compress_memory():
     assert compressed[-1]["content"] == "Message 19"
 
 
+def test_trim_history_within_budget():
+    """Test that history under the token budget is left untouched."""
+    messages = [
+        {"role": "system", "content": "[Previous conversation summary]: ..."},
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi!"}
+    ]
+
+    evicted, recent = trim_history(messages, max_tokens=100)
+    assert evicted == []
+    assert recent == messages
+
+
+def test_trim_history_over_budget():
+    """Test that trimming keeps whole recent turns and evicts the rest."""
+    messages = [{"role": "system", "content": "[Previous conversation summary]: ..."}]
+    for i in range(5):
+        messages.append({"role": "user", "content": f"Question {i} " + "x" * 40})
+        messages.append({"role": "assistant", "content": None, "tool_calls": []})
+        messages.append({"role": "tool", "content": "y" * 40})
+        messages.append({"role": "assistant", "content": f"Answer {i} " + "z" * 40})
+
+    evicted, recent = trim_history(messages, max_tokens=40)
+
+    assert evicted + recent == messages
+    assert evicted[0]["role"] == "system"
+    assert recent[0]["role"] == "user"
+    assert recent[0]["content"].startswith("Question 4")
+
+
+def test_trim_history_keeps_latest_turn():
+    """Test that the latest user message survives even when over budget."""
+    messages = [
+        {"role": "user", "content": "Old question"},
+        {"role": "assistant", "content": "Old answer"},
+        {"role": "user", "content": "x" * 1000}
+    ]
+
+    evicted, recent = trim_history(messages, max_tokens=10)
+    assert len(evicted) == 2
+    assert recent == [messages[-1]]
+
+
+def test_trim_history_leaves_room_after_trimming():
+    """Test that trimming cuts to half the budget so the next turns fit untrimmed."""
+    messages = []
+    summaries = 0
+    for i in range(40):
+        messages.append({"role": "user", "content": "x" * 200})
+        messages.append({"role": "assistant", "content": "y" * 200})
+        evicted, recent = trim_history(messages, max_tokens=1000)
+        if evicted:
+            summaries += 1
+            messages = [{"role": "system", "content": "summary"}] + recent
+
+    assert summaries <= 10
+
+
+def test_memory_writer_saves_latest_snapshot(temp_memory_file):
+    """Test that background saves are coalesced and the last one wins."""
+    writer = MemoryWriter()
+    messages = []
+    for i in range(20):
+        messages.append({"role": "user", "content": f"Message {i}"})
+        writer.save(messages)
+    writer.close()
+
+    with open(temp_memory_file, 'r') as f:
+        assert json.load(f) == messages
+
+
 def test_load_memory_invalid_json(temp_memory_file):
     """Test loading memory with invalid JSON."""
     # Write invalid JSON
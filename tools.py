@@ -1,176 +1,230 @@
 """Tool definitions and execution for the agentic chatbot."""
 import asyncio
+import importlib
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Dict
-from services.google.gmail.access_mail_gmail import access_gmail
-from services.google.gmail.write_mail_gmail import extract_email_details, send_email_from_draft
-from services.google.contacts.get_google_contacts import get_google_contacts
-from services.google.contacts.add_google_contacts import add_google_contacts
-from services.browser.browser_agent import execute_browser_task
-from services.light.control_light import control_lampe
+from typing import (
+    Annotated, Any, Callable, Dict, List, Literal, Optional, Tuple,
+    get_args, get_origin
+)
+
+
+# Long-lived event loop running async tools, so sessions they keep open
+# (e.g. the Tapo lamp) stay bound to the same loop between calls
+_LOOP = asyncio.new_event_loop()
+threading.Thread(target=_LOOP.run_forever, name="tools-loop", daemon=True).start()
+
+# Workers for tool calls returned together in one model response
+_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tools")
+
+
+def _lazy(module_path: str, attr: str, is_async: bool = False) -> Callable:
+    """Proxy for a tool whose module is only imported on its first call.
+
+    Service modules pull in the Google client, browser-use or tapo, so
+    importing them up front would slow down every start.
+
+    Args:
+        module_path: Dotted path of the module defining the tool
+        attr: Name of the tool function in that module
+        is_async: Whether the tool is a coroutine function
+
+    Returns:
+        Function with the same calling convention as the tool
+    """
+    target = None
+
+    def resolve() -> Callable:
+        nonlocal target
+        if target is None:
+            target = getattr(importlib.import_module(module_path), attr)
+        return target
+
+    if is_async:
+        async def proxy(*args, **kwargs):
+            return await resolve()(*args, **kwargs)
+    else:
+        def proxy(*args, **kwargs):
+            return resolve()(*args, **kwargs)
+
+    proxy.__name__ = proxy.__qualname__ = attr
+    return proxy
+
+
+# Tool registry mapping tool names to functions, and their schemas for the
+# Mistral API (following OpenAI function calling format)
+TOOL_FUNCTIONS: Dict[str, Callable] = {}
+TOOL_SCHEMAS: List[dict] = []
+
+# JSON schema type of each Python annotation used by tool parameters
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def tool(name: str, description: str, implementation: Optional[Callable] = None) -> Callable:
+    """Register a tool, generating its schema from the decorated signature.
+
+    Parameters are annotated as Annotated[type, "description"], a Literal
+    type becomes an enum and parameters without a default are required.
+
+    Args:
+        name: Tool name exposed to the model
+        description: Tool description exposed to the model
+        implementation: Function to run instead of the decorated one, used
+            with a signature-only stub for lazily imported tools
+
+    Returns:
+        Decorator returning the function unchanged
+    """
+    def register(fn: Callable) -> Callable:
+        properties = {}
+        required = []
+
+        for param in inspect.signature(fn).parameters.values():
+            hint = param.annotation
+            param_description = None
+            if get_origin(hint) is Annotated:
+                hint, param_description = get_args(hint)
+
+            if get_origin(hint) is Literal:
+                values = get_args(hint)
+                spec = {"type": _JSON_TYPES[type(values[0])], "enum": list(values)}
+            else:
+                spec = {"type": _JSON_TYPES[hint]}
+            if param_description:
+                spec["description"] = param_description
+
+            properties[param.name] = spec
+            if param.default is inspect.Parameter.empty:
+                required.append(param.name)
+
+        TOOL_FUNCTIONS[name] = implementation or fn
+        TOOL_SCHEMAS.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required
+                }
+            }
+        })
+        return fn
+
+    return register
 
 
 # Tool implementations
 
 
+# (day ordinal, formatted date), the string only changes at midnight
+_DATE_CACHE: Tuple[int, str] = (-1, "")
+
+
+@tool("get_date", "Get today's date in a readable format")
 def get_date() -> str:
     """Get today's date in a readable format.
 
     Returns:
         Today's date as a formatted string
     """
-    return datetime.now().strftime("%A, %B %d, %Y")
+    global _DATE_CACHE
+    today = datetime.now()
+    ordinal = today.toordinal()
+    if _DATE_CACHE[0] != ordinal:
+        _DATE_CACHE = (ordinal, today.strftime("%A, %B %d, %Y"))
+    return _DATE_CACHE[1]
 
 
-# Tool registry mapping tool names to functions
-TOOL_FUNCTIONS: Dict[str, Callable] = {
-    "get_date": get_date,
-    "access_gmail": access_gmail,
-    "send_mail_gmail": send_email_from_draft,
-    "get_google_contacts": get_google_contacts,
-    "add_google_contacts": add_google_contacts,
-    "execute_browser_task": execute_browser_task,
-    "control_light": control_lampe,
+# Service tools: signature-only stubs, the implementation is imported on first call
 
 
+@tool(
+    "access_gmail",
+    "Access Gmail to read emails",
+    _lazy("services.google.gmail.access_mail_gmail", "access_gmail")
+)
+def access_gmail(): ...
+
+
+@tool(
+    "send_mail_gmail",
+    "Send an email using a draft text",
+    _lazy("services.google.gmail.write_mail_gmail", "send_email_from_draft")
+)
+def send_mail_gmail(
+    draft: Annotated[str, (
+        "Draft email text containing recipient, subject, and body. "
+        "Format should include 'To : <recipient>', 'Subject : <subject>', and 'Body : <body>'."
+    )]
+): ...
+
+
+@tool(
+    "get_google_contacts",
+    "Retrieve all Google Contacts to find email addresses. MUST be called when the user mentions a contact by NAME (not email address) to get their email before sending a message. Always call this first when user says 'dis à X', 'envoie à X', 'contacte X' where X is a person's name.",
+    _lazy("services.google.contacts.get_google_contacts", "get_google_contacts")
+)
+def get_google_contacts(): ...
+
+
+@tool(
+    "add_google_contacts",
+    "Add a new contact to Google Contacts",
+    _lazy("services.google.contacts.add_google_contacts", "add_google_contacts")
+)
+def add_google_contacts(
+    name: Annotated[str, "Name of the contact"],
+    email: Annotated[str, "Email address of the contact"],
+    phone: Annotated[str, "Phone number of the contact (optional)"] = None
+): ...
+
+
+@tool(
+    "execute_browser_task",
+    "Exécute une tâche automatisée dans un navigateur web en utilisant Browser Use avec Gemini. Utilise cette fonction quand l'utilisateur demande d'aller sur un site, chercher des informations, remplir des formulaires, ou toute action nécessitant un navigateur.",
+    _lazy("services.browser.browser_agent", "execute_browser_task")
+)
+def execute_browser_task(
+    task_description: Annotated[str, "Description détaillée et précise de la tâche à accomplir dans le navigateur. Doit inclure les URLs, les étapes exactes, et ce qu'il faut chercher ou faire."],
+    expected_result: Annotated[str, "Ce que l'utilisateur attend comme résultat (ex: 'trouver le prix', 'télécharger le fichier', 'récupérer les informations')"]
+): ...
+
+
+@tool(
+    "control_light",
+    "Contrôle une lampe intelligente Tapo (allumer, éteindre, changer la luminosité ou la couleur)",
+    _lazy("services.light.control_light", "control_lampe", is_async=True)
+)
+def control_light(
+    action: Annotated[Literal[
+        "on", "off",
+        "brightness_min", "brightness_moyenne", "brightness_max", "brightness_porcentage",
+        "color_indigo", "color_blue", "color_rouge", "color_violet",
+        "color_vert", "color_rose", "color_white", "color_warm"
+    ], "L'action à effectuer sur la lampe"],
+    value: Annotated[int, "Valeur de luminosité en pourcentage (1-100), uniquement pour brightness_porcentage"] = None
+): ...
+
+
+# Whether each tool is async, resolved once instead of on every call
+_DISPATCH: Dict[str, Tuple[bool, Callable]] = {
+    name: (asyncio.iscoroutinefunction(fn), fn) for name, fn in TOOL_FUNCTIONS.items()
 }
 
+# Tools whose result is already a string and needs no conversion
+_RETURNS_STR = frozenset({"get_date", "send_mail_gmail", "add_google_contacts", "control_light"})
 
-# Tool schemas for Mistral API (following OpenAI function calling format)
-TOOL_SCHEMAS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_date",
-            "description": "Get today's date in a readable format",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "access_gmail",
-            "description": "Access Gmail to read emails",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "send_mail_gmail",
-            "description": "Send an email using a draft text",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "draft": {
-                        "type": "string",
-                        "description": (
-                            "Draft email text containing recipient, subject, and body. "
-                            "Format should include 'To : <recipient>', 'Subject : <subject>', and 'Body : <body>'."
-                        )
-                    }
-                },
-                "required": ["draft"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_google_contacts",
-            "description": "Retrieve all Google Contacts to find email addresses. MUST be called when the user mentions a contact by NAME (not email address) to get their email before sending a message. Always call this first when user says 'dis à X', 'envoie à X', 'contacte X' where X is a person's name.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "add_google_contacts",
-            "description": "Add a new contact to Google Contacts",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {
-                        "type": "string",
-                        "description": "Name of the contact"
-                    },
-                    "email": {
-                        "type": "string",
-                        "description": "Email address of the contact"
-                    },
-                    "phone": {
-                        "type": "string",
-                        "description": "Phone number of the contact (optional)"
-                    }
-                },
-                "required": ["name", "email"]
-            }
-        }
-    },
-
-    {
-                "type": "function",
-                "function": {
-                    "name": "execute_browser_task",
-                    "description": "Exécute une tâche automatisée dans un navigateur web en utilisant Browser Use avec Gemini. Utilise cette fonction quand l'utilisateur demande d'aller sur un site, chercher des informations, remplir des formulaires, ou toute action nécessitant un navigateur.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "task_description": {
-                                "type": "string",
-                                "description": "Description détaillée et précise de la tâche à accomplir dans le navigateur. Doit inclure les URLs, les étapes exactes, et ce qu'il faut chercher ou faire."
-                            },
-                            "expected_result": {
-                                "type": "string",
-                                "description": "Ce que l'utilisateur attend comme résultat (ex: 'trouver le prix', 'télécharger le fichier', 'récupérer les informations')"
-                            }
-                        },
-                        "required": ["task_description", "expected_result"]
-                    }
-                }
-            },
-
-    {
-        "type": "function",
-        "function": {
-            "name": "control_light",
-            "description": "Contrôle une lampe intelligente Tapo (allumer, éteindre, changer la luminosité ou la couleur)",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "action": {
-                        "type": "string",
-                        "enum": [
-                            "on", "off",
-                            "brightness_min", "brightness_moyenne", "brightness_max", "brightness_porcentage",
-                            "color_indigo", "color_blue", "color_rouge", "color_violet",
-                            "color_vert", "color_rose", "color_white", "color_warm"
-                        ],
-                        "description": "L'action à effectuer sur la lampe"
-                    },
-                    "value": {
-                        "type": "integer",
-                        "description": "Valeur de luminosité en pourcentage (1-100), uniquement pour brightness_porcentage"
-                    }
-                },
-                "required": ["action"]
-            }
-        }
-    }
-]
+# Schema lookups by tool name, and the arguments each tool requires
+TOOL_SCHEMAS_BY_NAME: Dict[str, dict] = {t["function"]["name"]: t for t in TOOL_SCHEMAS}
+TOOL_REQUIRED: Dict[str, frozenset] = {
+    name: frozenset(spec["function"]["parameters"]["required"])
+    for name, spec in TOOL_SCHEMAS_BY_NAME.items()
+}
 
 
 def execute_tool(tool_name: str, tool_args: Dict[str, Any]) -> str:
@@ -183,20 +237,59 @@ def execute_tool(tool_name: str, tool_args: Dict[str, Any]) -> str:
     Returns:
         Result of the tool execution as a string
     """
-    if tool_name not in TOOL_FUNCTIONS:
+    entry = _DISPATCH.get(tool_name)
+    if entry is None:
         return f"Error: Unknown tool '{tool_name}'"
 
+    if not isinstance(tool_args, dict):
+        return f"Error: Arguments for {tool_name} must be a JSON object"
+
+    required = TOOL_REQUIRED.get(tool_name, frozenset())
+    if not required.issubset(tool_args):
+        missing = ", ".join(sorted(required.difference(tool_args)))
+        return f"Error: Missing required arguments for {tool_name}: {missing}"
+
     try:
-        tool_func = TOOL_FUNCTIONS[tool_name]
+        is_async, tool_func = entry
 
-        # Check if the function is a coroutine (async function)
-        if asyncio.iscoroutinefunction(tool_func):
-            # Run async function in event loop
-            result = asyncio.run(tool_func(**tool_args))
+        if is_async:
+            # Run async function on the shared event loop
+            result = asyncio.run_coroutine_threadsafe(tool_func(**tool_args), _LOOP).result()
         else:
             # Run sync function normally
             result = tool_func(**tool_args)
 
-        return str(result)
+        return result if tool_name in _RETURNS_STR else str(result)
     except Exception as e:
         return f"Error executing {tool_name}: {str(e)}"
+
+
+def execute_tools(calls: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """Execute independent tool calls concurrently.
+
+    Different tools run in parallel on a thread pool, async ones being
+    scheduled together on the shared event loop. Calls to the same tool
+    run one after another in the model's order, since their effects can
+    depend on it (e.g. turning the lamp on then off).
+
+    Args:
+        calls: (tool_name, tool_args) pairs
+
+    Returns:
+        Result of each call as a string, in the order of calls
+    """
+    if len(calls) == 1:
+        return [execute_tool(*calls[0])]
+
+    groups: Dict[str, List[int]] = {}
+    for index, (tool_name, _) in enumerate(calls):
+        groups.setdefault(tool_name, []).append(index)
+
+    results: List[str] = [""] * len(calls)
+
+    def run_group(indexes: List[int]) -> None:
+        for index in indexes:
+            results[index] = execute_tool(*calls[index])
+
+    list(_POOL.map(run_group, groups.values()))
+    return results